@@ -0,0 +1,62 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.config import ADMIN_TOKEN
+from app.profiling import (
+    MODES,
+    PROFILED_JOBS,
+    arm_job,
+    armed_jobs,
+    list_profiles,
+    profile_file,
+    request_sample_rate,
+    set_request_sample_rate,
+)
+
+async def require_admin(x_admin_token: str = Header(None), authorization: str = Header(None)):
+    # Senza ADMIN_TOKEN gli endpoint di amministrazione non esistono
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # In alternativa all'header dedicato, "Authorization: Bearer <token>" (scrape di Prometheus)
+    token = x_admin_token
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):].strip()
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token non valido")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiling")
+async def get_profiling_status():
+    return {
+        "jobs": sorted(PROFILED_JOBS),
+        "armed": armed_jobs(),
+        "request_sample_rate": request_sample_rate(),
+    }
+
+@router.post("/profiling/jobs/{job_name}")
+async def arm_job_profile(job_name: str, mode: str = Query("sampling")):
+    if job_name not in PROFILED_JOBS:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Modalità non valida, usa una tra: {', '.join(MODES)}")
+    arm_job(job_name, mode)
+    return {"status": "armed", "job": job_name, "mode": mode}
+
+@router.post("/profiling/requests")
+async def set_request_profiling(rate: float = Query(..., ge=0, le=1)):
+    set_request_sample_rate(rate)
+    return {"request_sample_rate": request_sample_rate()}
+
+@router.get("/profiles")
+async def get_profiles():
+    return list_profiles()
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = profile_file(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profilo non trovato")
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
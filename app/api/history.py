@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.models.article import Article
+from app.models.team import Team
+from app.services.article_history import list_versions, reconstruct_version
+
+router = APIRouter()
+
+async def _get_article_id(db: AsyncSession, team_name: str) -> int:
+    result = await db.execute(
+        select(Article.id).join(Article.team).where(Team.name.ilike(team_name))
+    )
+    article_id = result.scalar_one_or_none()
+    if article_id is None:
+        raise HTTPException(status_code=404, detail="Articolo non trovato")
+    return article_id
+
+@router.get("/articles/{team_name}/history")
+async def get_article_history(team_name: str, db: AsyncSession = Depends(get_db)):
+    article_id = await _get_article_id(db, team_name)
+    versions = await list_versions(db, article_id)
+    return {
+        "team": team_name,
+        "versions": versions,
+        "raw_bytes": sum(v["raw_size"] for v in versions),
+        "stored_bytes": sum(v["stored_size"] for v in versions),
+    }
+
+@router.get("/articles/{team_name}/history/{version}")
+async def get_article_version(team_name: str, version: int, db: AsyncSession = Depends(get_db)):
+    article_id = await _get_article_id(db, team_name)
+    data = await reconstruct_version(db, article_id, version)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Versione non trovata")
+    return data
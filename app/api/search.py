@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.services.search import search, SearchUnavailable, SEARCH_TARGETS, MAX_LIMIT
+
+router = APIRouter()
+
+@router.get("/search")
+async def run_search(
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: str = Query("feeds", pattern=f"^({'|'.join(SEARCH_TARGETS)})$"),
+    limit: int = Query(20, ge=1, le=MAX_LIMIT),
+    cursor: str = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await search(db, q, kind=kind, limit=limit, cursor=cursor)
+    except SearchUnavailable:
+        raise HTTPException(status_code=501, detail="Ricerca full-text disponibile solo su PostgreSQL")
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursore non valido")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_db
+from app.services.llm_usage import usage_ledger, usage_by_team, usage_by_job
+
+router = APIRouter()
+
+@router.get("/usage/teams")
+async def get_usage_by_team(days: int = Query(7, ge=1, le=365), db: AsyncSession = Depends(get_db)):
+    return {"days": days, "teams": await usage_by_team(db, days)}
+
+@router.get("/usage/jobs")
+async def get_usage_by_job(days: int = Query(7, ge=1, le=365), db: AsyncSession = Depends(get_db)):
+    return {"days": days, "jobs": await usage_by_job(db, days)}
+
+@router.get("/usage/budget")
+async def get_usage_budget(db: AsyncSession = Depends(get_db)):
+    status = await usage_ledger.budget_status(db)
+    return {
+        "budget": status.budget,
+        "used": status.used,
+        "ratio": round(status.ratio, 4),
+        "near_limit": status.near_limit,
+        "exhausted": status.exhausted,
+    }
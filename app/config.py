@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import json
+import socket
 
 # Percorso del file feeds.json
 FEED_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "feeds.json")
@@ -13,6 +14,35 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
 STATIC_URL = os.getenv("STATIC_URL", "/static/")  # Default fallback
 
+# Modello per associazione e generazione: serve il supporto a response_format json_schema
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+# Budget giornaliero di token LLM (0 = illimitato) e soglia oltre la quale la generazione si degrada
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "0"))
+LLM_BUDGET_SOFT_RATIO = float(os.getenv("LLM_BUDGET_SOFT_RATIO", "0.8"))
+
+# Generazione articoli: budget per singolo run (0 = illimitato) e pesi della coda di priorità
+GENERATION_TIME_BUDGET_SECONDS = int(os.getenv("GENERATION_TIME_BUDGET_SECONDS", "900"))
+GENERATION_RUN_TOKEN_BUDGET = int(os.getenv("GENERATION_RUN_TOKEN_BUDGET", "0"))
+PAGE_VIEWS_DECAY = float(os.getenv("PAGE_VIEWS_DECAY", "0.5"))
+SKIPPED_RUN_AGING = float(os.getenv("SKIPPED_RUN_AGING", "0.5"))
+
+# Snapshot statico delle pagine: "dynamic" renderizza da DB (snapshot solo come riserva), "static" serve i file
+PUBLISH_DIR = os.getenv("PUBLISH_DIR", "publish")
+SERVE_MODE = os.getenv("SERVE_MODE", "dynamic").lower()
+
+# Profiling su richiesta (endpoint /api/admin, disattivati se ADMIN_TOKEN non è impostato)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_REQUEST_SAMPLE_RATE = float(os.getenv("PROFILE_REQUEST_SAMPLE_RATE", "0"))
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "0"))  # 0 = watchdog disattivato
+LOOP_STALL_DUMP_INTERVAL_SECONDS = float(os.getenv("LOOP_STALL_DUMP_INTERVAL_SECONDS", "60"))  # al massimo uno stack ogni N secondi
+
+# Sharding dei team tra più processi worker (disattivato: un solo worker gestisce tutto)
+WORKER_SHARDING = os.getenv("WORKER_SHARDING", "false").lower() in ("1", "true", "yes")
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_HEARTBEAT_TTL_SECONDS = int(os.getenv("WORKER_HEARTBEAT_TTL_SECONDS", "90"))
+
 # Carica gli RSS dal file esterno
 def load_rss_feeds():
     with open(FEED_CONFIG_PATH, "r", encoding="utf-8") as f:
@@ -2,8 +2,14 @@
 
 import os
 import ssl
+import time
+import uuid
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.metrics import instrument_engine, DB_POOL_WAIT, DB_POOL_CHECKED_OUT
 
 # Carica .env se presente
 load_dotenv()
@@ -13,29 +19,144 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL non impostato nelle variabili ambiente")
 
-# Converti URL per asyncpg
-if DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+# Replica di sola lettura opzionale per le pagine web
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or DATABASE_URL
 
-# Configura SSL per Railway
-connect_args = {}
-if "railway" in DATABASE_URL:
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    connect_args = {"ssl": ssl_context}
+# PgBouncer in transaction pooling: niente prepared statement persistenti né parametri di startup
+PGBOUNCER = os.getenv("PGBOUNCER", "false").lower() in ("1", "true", "yes")
+ASYNCPG_STATEMENT_CACHE_SIZE = int(os.getenv("ASYNCPG_STATEMENT_CACHE_SIZE", "100"))
 
-# Crea il motore async
-engine = create_async_engine(DATABASE_URL, pool_pre_ping=True, connect_args=connect_args)
 
-# Session factory
-async_session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+def _asyncpg_url(url: str) -> str:
+    # Converti URL per asyncpg
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if PGBOUNCER and url.startswith("postgresql+asyncpg://"):
+        url = make_url(url).update_query_dict({"prepared_statement_cache_size": "0"}).render_as_string(hide_password=False)
+    return url
 
-# Dependency FastAPI
+
+# Profili: "web" per le richieste HTTP (pool piccolo, attese brevi, sola lettura),
+# "jobs" per lo scheduler (pool limitato, statement lunghi consentiti)
+ENGINE_PROFILES = {
+    "web": {
+        "url": _asyncpg_url(DATABASE_READ_URL),
+        "pool_size": int(os.getenv("WEB_DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("WEB_DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": float(os.getenv("WEB_DB_POOL_TIMEOUT", "3")),
+        "statement_timeout_ms": int(os.getenv("WEB_DB_STATEMENT_TIMEOUT_MS", "5000")),
+        "read_only": True,
+    },
+    "jobs": {
+        "url": _asyncpg_url(DATABASE_URL),
+        "pool_size": int(os.getenv("JOBS_DB_POOL_SIZE", "3")),
+        "max_overflow": int(os.getenv("JOBS_DB_MAX_OVERFLOW", "2")),
+        "pool_timeout": float(os.getenv("JOBS_DB_POOL_TIMEOUT", "60")),
+        "statement_timeout_ms": int(os.getenv("JOBS_DB_STATEMENT_TIMEOUT_MS", "600000")),
+        "read_only": False,
+    },
+}
+
+
+def _connect_args(name: str, profile: dict) -> dict:
+    url = profile["url"]
+    if not url.startswith("postgresql+asyncpg://"):
+        return {}
+
+    connect_args = {}
+
+    # Configura SSL per Railway
+    if "railway" in url:
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        connect_args["ssl"] = ssl_context
+
+    if PGBOUNCER:
+        connect_args["statement_cache_size"] = 0
+        # Nomi univoci: con il pooling a transazione la connessione server cambia tra una query e l'altra
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    else:
+        connect_args["statement_cache_size"] = ASYNCPG_STATEMENT_CACHE_SIZE
+        server_settings = {
+            "application_name": f"top10market-{name}",
+            "statement_timeout": str(profile["statement_timeout_ms"]),
+        }
+        if profile["read_only"]:
+            server_settings["default_transaction_read_only"] = "on"
+        connect_args["server_settings"] = server_settings
+
+    return connect_args
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Misura quanto si aspetta una connessione dal pool (inclusa l'eventuale apertura)."""
+    profile = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self.profile).observe(time.perf_counter() - start)
+
+
+def _create_engine(name: str):
+    profile = ENGINE_PROFILES[name]
+    url = profile["url"]
+    options = {"pool_pre_ping": True, "connect_args": _connect_args(name, profile)}
+
+    if url.startswith("postgresql"):
+        options.update(
+            poolclass=type(f"{name.capitalize()}Pool", (InstrumentedPool,), {"profile": name}),
+            pool_size=profile["pool_size"],
+            max_overflow=profile["max_overflow"],
+            pool_timeout=profile["pool_timeout"],
+            pool_recycle=1800,
+        )
+
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine)
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(name).dec()
+
+    if PGBOUNCER and url.startswith("postgresql"):
+        # Senza parametri di startup, timeout e sola lettura si impostano per transazione
+        @event.listens_for(engine.sync_engine, "begin")
+        def _on_begin(conn):
+            if profile["read_only"]:
+                conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(profile['statement_timeout_ms'])}")
+
+        # I portali nominati di un cursore lato server non sono affidabili dietro il pooling a
+        # transazione: le query a blocchi passano da iter_batches (paginazione keyset)
+        @event.listens_for(engine.sync_engine, "before_execute")
+        def _no_server_side_cursors(conn, clauseelement, multiparams, params, execution_options):
+            if execution_options.get("stream_results") or execution_options.get("yield_per"):
+                raise RuntimeError("Cursori lato server non supportati con PGBOUNCER: usare iter_batches")
+
+    return engine
+
+
+# Crea i motori async
+engines = {name: _create_engine(name) for name in ENGINE_PROFILES}
+engine = engines["jobs"]
+
+# Session factory: async_session per job e servizi, web_session per le richieste HTTP
+async_session = async_sessionmaker(bind=engines["jobs"], expire_on_commit=False, class_=AsyncSession)
+web_session = async_sessionmaker(bind=engines["web"], expire_on_commit=False, class_=AsyncSession)
+
+# Dependency FastAPI: sessione di sola lettura sul profilo web
 async def get_db():
-    async with async_session() as session:
+    async with web_session() as session:
         yield session
 
 # Export engine
-def get_engine():
-    return engine
+def get_engine(profile: str = "jobs"):
+    return engines[profile]
@@ -1,5 +1,5 @@
-# Mappa URL feed RSS (completi) a team_id
-# Puoi modificare gli URL mantenendo gli ID associati
+# Seed iniziale della tabella feed_sources: URL feed RSS (completi) → team_id.
+# Letta solo al primo avvio; da lì in poi le sorgenti si gestiscono sul DB.
 
 FEED_TEAM_MAP = {
     #"https://rss.app/feeds/I1WwXsKtpEdFbr4F.xml": 1,
@@ -1,25 +1,65 @@
 from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.routing import Match
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 from sqlalchemy import text
 import os
+import time
 
-from app.db import get_db, get_engine
+from app.db import get_db, get_engine, async_session
 from app.models.article import Article
 from app.models.team import Team
 from app.models.base import Base
-from app.config import STATIC_URL
+from app.config import STATIC_URL, WORKER_SHARDING, SERVE_MODE, LOOP_LAG_THRESHOLD_MS
 from app.api.jobs import router as jobs_router
+from app.api.usage import router as usage_router
+from app.api.search import router as search_router
+from app.api.history import router as history_router
+from app.api.admin import router as admin_router, require_admin
 from app.scheduler import scheduler, schedule_jobs
+from app.metrics import HTTP_REQUEST_DURATION, metrics_payload
+from app.services.llm_usage import usage_ledger
+from app.services.feed_source_service import seed_feed_sources
+from app.services.article_history import history_recorder
+from app.services.generation_planner import page_views
+from app.services.static_publisher import publish_snapshot, snapshot_server
+from app.sharding import deregister
+from app.schema_upgrades import apply_schema_upgrades, build_search_indexes
+from app.profiling import loop_watchdog, run_profiled, should_profile_request
 
 
 app = FastAPI()
 
+def _resolve_route(request: Request):
+    # Lo snapshot risponde prima del routing: senza la route le metriche di latenza userebbero "unmatched"
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            request.scope["route"] = route
+            return
+
+# 🗂️ Middleware: pagine dallo snapshot statico (SERVE_MODE=static, oppure quando il DB non risponde)
+@app.middleware("http")
+async def serve_snapshot(request: Request, call_next):
+    if SERVE_MODE == "static":
+        response = snapshot_server.response(request)
+        if response is not None:
+            _resolve_route(request)
+            return response
+    try:
+        return await call_next(request)
+    except Exception as e:
+        response = snapshot_server.response(request)
+        if response is None:
+            raise
+        print(f"⚠️ Errore nel rendering di {request.url.path}, servo lo snapshot statico: {e}")
+        return response
+
 # 🔁 Middleware: Redirect da top10market.it a www.top10market.it
 @app.middleware("http")
 async def redirect_root_domain(request: Request, call_next):
@@ -31,6 +71,29 @@ async def redirect_root_domain(request: Request, call_next):
         return RedirectResponse(url=new_url, status_code=301)
     return await call_next(request)
 
+# ⏱️ Middleware: latenza HTTP per route (template della route, non il path reale)
+@app.middleware("http")
+async def track_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_DURATION.labels(request.method, route_path, str(status)).observe(
+            time.perf_counter() - start
+        )
+
+# 🔬 Middleware: profilo cProfile di una frazione delle richieste (vedi /api/admin/profiling)
+@app.middleware("http")
+async def profile_sampled_requests(request: Request, call_next):
+    if not should_profile_request():
+        return await call_next(request)
+    return await run_profiled(f"request-{request.method}-{request.url.path}", "cprofile", call_next, request)
+
 # 🚀 Startup: connessione DB + scheduler
 @app.on_event("startup")
 async def startup_event():
@@ -49,17 +112,56 @@ async def startup_event():
     try:
         async with get_engine().begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await apply_schema_upgrades(conn)
         print("✅ Tabelle del database create (se non esistevano)")
     except Exception as e:
         print("❌ Errore nella creazione delle tabelle:", e)
 
+    # ✅ Sorgenti RSS su DB (seed da FEED_TEAM_MAP al primo avvio, feeds.json come sorgenti multi-team)
+    try:
+        async with async_session() as db:
+            seeded = await seed_feed_sources(db)
+        if seeded:
+            print(f"✅ Inserite {seeded} sorgenti RSS in feed_sources")
+    except Exception as e:
+        print("❌ Errore nel seed delle sorgenti RSS:", e)
+
+    # ✅ Snapshot statico delle pagine
+    try:
+        async with async_session() as db:
+            written = await publish_snapshot(db)
+        print(f"✅ Snapshot statico aggiornato ({written} pagine team)")
+    except Exception as e:
+        print("❌ Errore nella pubblicazione dello snapshot statico:", e)
+
+    # ✅ Watchdog dell'event loop
+    if LOOP_LAG_THRESHOLD_MS > 0:
+        loop_watchdog.start()
+
     # ✅ Avvio scheduler
     schedule_jobs()
+    # Indici di ricerca costruiti una volta in background (CREATE INDEX CONCURRENTLY): l'avvio non li attende
+    scheduler.add_job(build_search_indexes, args=[get_engine()], id="build_search_indexes")
     scheduler.start()
     print("🚀 Scheduler avviato con job:", scheduler.get_jobs())
 
+# 🛑 Shutdown: scrive i record di usage LLM ancora in memoria
+@app.on_event("shutdown")
+async def shutdown_event():
+    await usage_ledger.flush()
+    await history_recorder.drain()
+    await page_views.flush()
+    await loop_watchdog.stop()
+    if WORKER_SHARDING:
+        async with async_session() as db:
+            await deregister(db)
+
 # 📦 Static & router
 app.include_router(jobs_router, prefix="/api")
+app.include_router(usage_router, prefix="/api")
+app.include_router(search_router, prefix="/api")
+app.include_router(history_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
@@ -98,6 +200,8 @@ async def read_article(team_name: str, request: Request, db: AsyncSession = Depe
     if not article:
         raise HTTPException(status_code=404, detail="Articolo non trovato")
 
+    page_views.hit(article.team_id)
+
     return templates.TemplateResponse(
         "article.html",
         {
@@ -107,6 +211,12 @@ async def read_article(team_name: str, request: Request, db: AsyncSession = Depe
         }
     )
 
+# 📊 Metriche Prometheus (protette come /api/admin: label per team/job e stato dei pool DB)
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
 # 📄 Servizio ads.txt
 @app.get("/ads.txt", include_in_schema=False)
 async def serve_ads_txt():
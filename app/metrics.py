@@ -0,0 +1,165 @@
+# app/metrics.py
+#
+# Metriche Prometheus della pipeline e del sito, esposte su /metrics.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlparse
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+
+# Job dello scheduler
+JOB_DURATION = Histogram(
+    "job_duration_seconds",
+    "Durata dei job dello scheduler",
+    ["job"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+JOB_FAILURES = Counter("job_failures_total", "Job terminati con eccezione", ["job"])
+
+# Feed lungo la pipeline: ingested, skipped, extracted, associated
+FEEDS_TOTAL = Counter("pipeline_feeds_total", "Feed per fase della pipeline", ["stage"])
+
+# Estrazione contenuti: strategy = resolve | newspaper | beautifulsoup
+EXTRACTION_DURATION = Histogram(
+    "extraction_duration_seconds",
+    "Latenza di risoluzione ed estrazione articoli",
+    ["strategy", "host"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20),
+)
+
+# Chiamate LLM per call site
+LLM_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "Latenza delle chiamate OpenAI",
+    ["call_site", "model"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 40, 60),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Token consumati", ["call_site", "direction"])
+# reason: "transport" (rete/API) oppure "validation" (risposta fuori schema, troncata o oltre i limiti)
+LLM_ERRORS = Counter("llm_errors_total", "Chiamate OpenAI fallite", ["call_site", "reason"])
+
+# Database
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Durata delle query SQL",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Pool di connessioni per profilo (web, jobs)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Attesa per ottenere una connessione dal pool",
+    ["profile"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 3, 10, 60),
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connessioni in uso", ["profile"])
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latenza delle richieste HTTP per route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+# Event loop: ritardo dei tick del watchdog (callback bloccanti, es. I/O sincrono in una coroutine)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Ritardo dell'event loop rispetto al tick atteso",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+EVENT_LOOP_STALLS = Counter("event_loop_stalls_total", "Blocchi dell'event loop oltre la soglia")
+
+
+# Identificativo dell'esecuzione corrente di un job (es. "feed_association_job:20250101T084500")
+current_job_run: ContextVar = ContextVar("current_job_run", default=None)
+
+
+def track_job(job_name: str):
+    """Decoratore per i job async: misura la durata, conta i fallimenti e marca il job run."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = current_job_run.set(f"{job_name}:{datetime.utcnow():%Y%m%dT%H%M%S}")
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                JOB_FAILURES.labels(job_name).inc()
+                raise
+            finally:
+                JOB_DURATION.labels(job_name).observe(time.perf_counter() - start)
+                current_job_run.reset(token)
+        return wrapper
+    return decorator
+
+
+def url_host(url: str) -> str:
+    return urlparse(url).hostname or "unknown"
+
+
+@contextmanager
+def time_extraction(strategy: str, url: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        EXTRACTION_DURATION.labels(strategy, url_host(url)).observe(time.perf_counter() - start)
+
+
+class _Timer:
+    elapsed = 0.0
+
+
+@contextmanager
+def time_llm_call(call_site: str, model: str):
+    timer = _Timer()
+    start = time.perf_counter()
+    try:
+        yield timer
+    except Exception:
+        LLM_ERRORS.labels(call_site, "transport").inc()
+        raise
+    finally:
+        timer.elapsed = time.perf_counter() - start
+        LLM_DURATION.labels(call_site, model).observe(timer.elapsed)
+
+
+def record_llm_tokens(call_site: str, response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.labels(call_site, "in").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(call_site, "out").inc(usage.completion_tokens or 0)
+
+
+def instrument_engine(engine) -> None:
+    """Aggancia gli event hook SQLAlchemy per cronometrare ogni query."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start_time"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        # La query fallita non passa da after_cursor_execute: scarta il suo timer
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+
+def metrics_payload():
+    return generate_latest(), CONTENT_TYPE_LATEST
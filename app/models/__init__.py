@@ -1,4 +1,9 @@
 from .base import Base  # unica fonte di verità per Base
 from .team import Team
 from .feed import Feed
-from .article import Article
\ No newline at end of file
+from .article import Article
+from .llm_usage import LLMUsage
+from .feed_source import FeedSource
+from .worker import WorkerHeartbeat
+from .article_history import ArticleHistory
+from .team_schedule import TeamScheduleState
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Boolean, LargeBinary, TIMESTAMP, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+class ArticleHistory(Base):
+    __tablename__ = "article_history"
+    __table_args__ = (UniqueConstraint("article_id", "version", name="uq_article_history_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), nullable=False, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), nullable=True)
+    version = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    # Keyframe: versione completa compressa. Altrimenti: delta compresso rispetto alla versione precedente
+    is_keyframe = Column(Boolean, nullable=False, default=False)
+    payload = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, nullable=False)  # dimensione della versione completa, per le statistiche di spazio
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.models.base import Base
+
+class FeedSource(Base):
+    __tablename__ = "feed_sources"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(1024), unique=True, nullable=False)
+    enabled = Column(Boolean, default=True, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    # Ultima entry letta dalle sorgenti multi-team: la lettura in streaming si ferma qui
+    last_entry_id = Column(String(1024), nullable=True)
+
+    # Team a cui appartengono tutte le entry del feed; None = sorgente multi-team da associare via AI
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), nullable=True, index=True)
+    team = relationship("Team")
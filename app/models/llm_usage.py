@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Boolean, Float, TIMESTAMP, ForeignKey
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+class LLMUsage(Base):
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), index=True)
+    call_site = Column(String(50), nullable=False)  # es. article_generate, feed_association
+    model = Column(String(50), nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=False, default=0)
+    cache_hit = Column(Boolean, nullable=False, default=False)  # prompt caching lato OpenAI
+
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), nullable=True, index=True)
+    job_run = Column(String(100), nullable=True, index=True)  # es. feed_association_job:20250101T084500
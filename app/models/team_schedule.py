@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, Float, TIMESTAMP, ForeignKey
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+class TeamScheduleState(Base):
+    __tablename__ = "team_schedule_state"
+
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+
+    # Visite alla pagina del team, con decadimento a ogni run di generazione
+    page_views = Column(Float, default=0.0, nullable=False)
+
+    # Run consecutivi in cui il team aveva feed nuovi ma è rimasto fuori dal budget
+    skipped_runs = Column(Integer, default=0, nullable=False)
+
+    last_processed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
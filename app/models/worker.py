@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, TIMESTAMP
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+class WorkerHeartbeat(Base):
+    __tablename__ = "worker_heartbeats"
+
+    worker_id = Column(String(100), primary_key=True)
+    started_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    last_seen = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
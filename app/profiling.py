@@ -0,0 +1,303 @@
+# app/profiling.py
+#
+# Profiling su richiesta di job e richieste HTTP, più un watchdog dell'event loop.
+#
+# - Un job può essere "armato" (vedi /api/admin/profiling): la sua prossima esecuzione gira
+#   sotto cProfile (.prof + riepilogo .txt) o sotto un campionatore di stack (.collapsed,
+#   pronto per flamegraph.pl / speedscope).
+# - Una frazione configurabile delle richieste HTTP viene profilata con cProfile.
+# - Il watchdog misura il ritardo dell'event loop e, se supera la soglia, salva lo stack
+#   del thread del loop in loop-stalls.log: è lì che compaiono le chiamate bloccanti.
+#
+# Job e richieste condividono il thread dell'event loop, quindi un profilo contiene anche
+# le altre coroutine eseguite nello stesso intervallo. Un solo profilo alla volta è attivo.
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+from app.config import PROFILE_DIR, PROFILE_REQUEST_SAMPLE_RATE, LOOP_LAG_THRESHOLD_MS, LOOP_STALL_DUMP_INTERVAL_SECONDS
+from app.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+logger = logging.getLogger("profiling")
+
+MODES = ("cprofile", "sampling")
+SAMPLE_INTERVAL = 0.005
+STALL_LOG = "loop-stalls.log"
+STALL_LOG_MAX_BYTES = 5 * 1024 * 1024  # oltre questa dimensione il log viene ruotato in loop-stalls.log.1
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Un solo profilo attivo: cProfile e campionatore osservano lo stesso thread del loop
+_active = threading.Lock()
+_state_lock = threading.Lock()
+_armed: Dict[str, str] = {}
+_request_sample_rate = PROFILE_REQUEST_SAMPLE_RATE
+
+# Job decorati con profile_job, per validare le richieste di arm
+PROFILED_JOBS: set = set()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Stack nel formato "radice;...;foglia" usato da flamegraph.pl."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Campiona a intervalli regolari lo stack di un thread da un thread separato."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _profile_path(label: str, mode: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{_SAFE_RE.sub('_', label)}-{datetime.utcnow():%Y%m%dT%H%M%S%f}-{mode}{suffix}"
+    return os.path.join(PROFILE_DIR, name)
+
+
+def _save_cprofile(label: str, profiler: cProfile.Profile) -> str:
+    path = _profile_path(label, "cprofile", ".prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+    with open(path[:-len(".prof")] + ".txt", "w", encoding="utf-8") as f:
+        f.write(summary.getvalue())
+    return path
+
+
+def _save_sampling(label: str, sampler: SamplingProfiler) -> str:
+    path = _profile_path(label, "sampling", ".collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+    return path
+
+
+async def run_profiled(label: str, mode: str, func, *args, **kwargs):
+    """Esegue `await func(...)` sotto il profiler richiesto; senza profilo se un altro è già attivo."""
+    if not _active.acquire(blocking=False):
+        logger.info(f"[Profiling] Profilo già in corso, {label} eseguito senza profilo.")
+        return await func(*args, **kwargs)
+
+    profiler = sampler = None
+    try:
+        if mode == "sampling":
+            sampler = SamplingProfiler(threading.get_ident())
+            sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+                path = await asyncio.to_thread(_save_sampling, label, sampler)
+            else:
+                profiler.disable()
+                path = await asyncio.to_thread(_save_cprofile, label, profiler)
+            logger.info(f"[Profiling] Profilo di {label} salvato in {path}")
+    finally:
+        _active.release()
+
+
+def arm_job(job_name: str, mode: str) -> None:
+    """Profila la prossima esecuzione del job."""
+    with _state_lock:
+        _armed[job_name] = mode
+
+
+def armed_jobs() -> Dict[str, str]:
+    with _state_lock:
+        return dict(_armed)
+
+
+def _take_armed(job_name: str) -> Optional[str]:
+    with _state_lock:
+        return _armed.pop(job_name, None)
+
+
+def profile_job(job_name: str):
+    """Decoratore per i job async: se il job è armato, la sua esecuzione viene profilata."""
+    PROFILED_JOBS.add(job_name)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            mode = _take_armed(job_name)
+            if mode is None:
+                return await func(*args, **kwargs)
+            return await run_profiled(job_name, mode, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_request_sample_rate(rate: float) -> None:
+    global _request_sample_rate
+    with _state_lock:
+        _request_sample_rate = min(max(rate, 0.0), 1.0)
+
+
+def request_sample_rate() -> float:
+    return _request_sample_rate
+
+
+def should_profile_request() -> bool:
+    rate = _request_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            profiles.append({
+                "name": entry.name,
+                "size": stat.st_size,
+                "modified": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+    return sorted(profiles, key=lambda p: p["modified"], reverse=True)
+
+
+def profile_file(name: str) -> Optional[str]:
+    """Path del profilo `name`, solo se è un file direttamente dentro PROFILE_DIR."""
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+class LoopLagWatchdog:
+    """
+    Un tick nel loop aggiorna un timestamp ogni `interval`; un thread separato controlla che
+    il timestamp avanzi. Se il loop resta fermo oltre la soglia, lo stack del thread del loop
+    viene salvato una volta per blocco: indica la callback che sta bloccando. Tutti i blocchi
+    finiscono nella metrica, ma al massimo uno stack ogni `dump_interval` secondi finisce nel log.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.1, dump_interval: float = LOOP_STALL_DUMP_INTERVAL_SECONDS):
+        self.threshold = threshold
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            EVENT_LOOP_LAG.observe(max(now - expected, 0.0))
+            self._last_tick = now
+
+    def _watch(self) -> None:
+        reported_tick = None
+        last_dump = None
+        suppressed = 0
+        while not self._stop.wait(self.interval):
+            last_tick = self._last_tick
+            stalled = time.monotonic() - last_tick - self.interval
+            if stalled < self.threshold or last_tick == reported_tick:
+                continue
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            EVENT_LOOP_STALLS.inc()
+            now = time.monotonic()
+            if last_dump is not None and now - last_dump < self.dump_interval:
+                suppressed += 1
+                continue
+            last_dump = now
+            stack = "".join(traceback.format_stack(frame))
+            note = f" ({suppressed} blocchi precedenti non salvati)" if suppressed else ""
+            suppressed = 0
+            logger.warning(f"[Profiling] Event loop bloccato da {stalled * 1000:.0f} ms{note}:\n{stack}")
+            self._append_stall(stalled, stack, note)
+
+    def _append_stall(self, stalled: float, stack: str, note: str = "") -> None:
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, STALL_LOG)
+            if os.path.exists(path) and os.path.getsize(path) > STALL_LOG_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(f"=== {datetime.utcnow().isoformat()} loop fermo da {stalled * 1000:.0f} ms{note}\n{stack}\n")
+        except OSError as e:
+            logger.error(f"[Profiling] Impossibile scrivere {STALL_LOG}: {e}")
+
+
+loop_watchdog = LoopLagWatchdog(LOOP_LAG_THRESHOLD_MS / 1000)
@@ -8,6 +8,16 @@ from app.services.feed_ingestion import ingest_feeds
 from app.services.feed_association import FeedTeamAssociatorAI
 from app.services.article_ai import ArticleAIProcessor
 from app.services.article_extractor import FeedContentFetcher  # Nuova classe
+from app.services.llm_usage import usage_ledger
+from app.services.article_history import history_recorder
+from app.services.generation_planner import page_views
+from app.services.static_publisher import publish_snapshot
+from app.services.feed_source_service import get_enabled_sources
+from app.services.team_service import get_all_teams
+from app.metrics import track_job
+from app.profiling import profile_job
+from app.sharding import current_shard, heartbeat, Shard
+from app.config import WORKER_SHARDING
 
 scheduler = AsyncIOScheduler()
 
@@ -39,41 +49,95 @@ def schedule_jobs():
                       replace_existing=True,
                       next_run_time=None)
 
+    scheduler.add_job(page_views_flush_job,
+                      trigger="interval",
+                      minutes=5,
+                      id="page_views_flush_job",
+                      replace_existing=True)
+
+    if WORKER_SHARDING:
+        scheduler.add_job(worker_heartbeat_job,
+                          trigger="interval",
+                          seconds=30,
+                          id="worker_heartbeat_job",
+                          replace_existing=True,
+                          next_run_time=datetime.now())
+
+async def _owned_team_ids(db, shard: Shard):
+    """Team dello shard di questo worker; None se il worker è l'unico (nessun filtro)."""
+    if shard.count == 1:
+        return None
+    return shard.team_ids(team.id for team in await get_all_teams(db))
+
 # ===============================
 # Async Job Functions (Unchanged)
 # ===============================
 
+@track_job("feed_ingestion_job")
+@profile_job("feed_ingestion_job")
 async def feed_ingestion_job():
     print(f"[{datetime.now()}] Starting feed ingestion job...")
     async with async_session() as db:
-        await ingest_feeds(db)
+        shard = await current_shard(db)
+        sources = [source for source in await get_enabled_sources(db) if shard.owns_source(source)]
+        await ingest_feeds(db, sources=sources, run_cleanup=shard.owns("sgr_ezza_feeds"))
     print(f"[{datetime.now()}] Feed ingestion job completed.")
 
+@track_job("feed_association_job")
+@profile_job("feed_association_job")
 async def feed_association_job():
     print(f"[{datetime.now()}] Starting feed association job...")
     async with async_session() as db:
+        shard = await current_shard(db)
         associator = FeedTeamAssociatorAI(db)
-        await associator.associate_feeds()
+        await associator.associate_feeds(partition=(shard.index, shard.count) if shard.count > 1 else None)
+    await usage_ledger.flush()
     print(f"[{datetime.now()}] Feed association job completed.")
 
+@track_job("process_all_teams_articles_job")
+@profile_job("process_all_teams_articles_job")
 async def process_all_teams_articles_job():
     print(f"[{datetime.now()}] Starting process all teams articles job...")
+    # Visite aggiornate prima di calcolare le priorità
+    await page_views.flush()
     async with async_session() as db:
+        team_ids = await _owned_team_ids(db, await current_shard(db))
         processor = ArticleAIProcessor(db)
-        await processor.process_all_teams()
+        await processor.process_all_teams(team_ids=team_ids)
+        try:
+            await publish_snapshot(db)
+        except Exception as e:
+            print(f"Errore nella pubblicazione dello snapshot statico: {e}")
+    await usage_ledger.flush()
+    await history_recorder.drain()
     print(f"[{datetime.now()}] Process all teams articles job completed.")
 
+@track_job("cleanup_feeds_job")
+@profile_job("cleanup_feeds_job")
 async def cleanup_feeds_job():
     print(f"[{datetime.now()}] Starting cleanup feeds job...")
     async with async_session() as db:
+        if not (await current_shard(db)).owns("cleanup_feeds_job"):
+            print("Cleanup feeds gestito da un altro worker.")
+            return
         processor = ArticleAIProcessor(db)
         await processor.cleanup_feeds()
     print(f"[{datetime.now()}] Cleanup feeds job completed.")
 
+@track_job("enrich_feed_contents_job")
+@profile_job("enrich_feed_contents_job")
 async def enrich_feed_contents_job():
     print(f"[{datetime.now()}] Starting enrich feed contents job...")
     async with async_session() as db:
+        team_ids = await _owned_team_ids(db, await current_shard(db))
         fetcher = FeedContentFetcher(db)
-        updated = await fetcher.enrich_feed_content()
+        updated = await fetcher.enrich_feed_content(team_ids=team_ids)
         print(f"Updated {updated} feeds with content.")
     print(f"[{datetime.now()}] Enrich feed contents job completed.")
+
+async def worker_heartbeat_job():
+    async with async_session() as db:
+        await heartbeat(db)
+
+async def page_views_flush_job():
+    await page_views.flush()
@@ -0,0 +1,76 @@
+# app/schema_upgrades.py
+#
+# create_all crea solo le tabelle mancanti: le colonne aggiunte dopo il primo deploy
+# vanno portate sulle tabelle esistenti con ALTER idempotenti, eseguiti all'avvio.
+#
+# Gli indici di ricerca full-text sono invece costruiti in background con
+# CREATE INDEX CONCURRENTLY su un'espressione: niente riscrittura della tabella né lock
+# esclusivo, quindi avvio e job non restano bloccati anche con tabelle feeds grandi.
+
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger("schema_upgrades")
+
+SEARCH_LOCK_TIMEOUT = "5s"  # il DROP della vecchia colonna rinuncia invece di accodarsi ai job
+
+
+def search_vector_sql(table: str, qualify: bool = False) -> str:
+    """
+    tsvector (configurazione italiana) con i pesi ts_rank: A titolo, B summary, C testo.
+    La ricerca deve usare la stessa espressione dell'indice perché il planner lo scelga.
+    """
+    prefix = f"{table}." if qualify else ""
+    parts = [
+        f"setweight(to_tsvector('italian', coalesce({prefix}{column}, '')), '{weight}')"
+        for column, weight in (("title", "A"), ("summary", "B"), ("content", "C"))
+    ]
+    return f"({' || '.join(parts)})"
+
+
+SEARCH_TABLES = ("feeds", "articles")
+
+POSTGRES_UPGRADES = [
+    "ALTER TABLE feed_sources ADD COLUMN IF NOT EXISTS last_entry_id VARCHAR(1024)",
+]
+
+async def apply_schema_upgrades(conn):
+    # Sugli altri dialetti (SQLite dei benchmark) il DB nasce sempre da create_all
+    if conn.dialect.name != "postgresql":
+        return
+    for statement in POSTGRES_UPGRADES:
+        await conn.execute(text(statement))
+
+
+async def build_search_indexes(engine) -> None:
+    """
+    Indici GIN per app/services/search.py. Va eseguito fuori da una transazione (CONCURRENTLY):
+    un indice rimasto invalido da un tentativo interrotto viene eliminato e ricostruito.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"SET lock_timeout = '{SEARCH_LOCK_TIMEOUT}'"))
+        for table in SEARCH_TABLES:
+            index = f"ix_{table}_search"
+            try:
+                valid = (await conn.execute(
+                    text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                         "WHERE c.relname = :name"),
+                    {"name": index},
+                )).scalar()
+                if valid is False:
+                    logger.warning(f"[SchemaUpgrades] Indice {index} invalido, ricostruzione.")
+                    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+                if not valid:
+                    await conn.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} "
+                        f"USING GIN ({search_vector_sql(table)})"
+                    ))
+                    logger.info(f"[SchemaUpgrades] Indice {index} creato.")
+                # Colonna generata delle versioni precedenti: il DROP non riscrive la tabella
+                await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector"))
+            except Exception as e:
+                logger.error(f"[SchemaUpgrades] Indice di ricerca su {table} non aggiornato: {e}")
@@ -1,21 +1,42 @@
 import os
-import json
 import logging
-from typing import List, Union
+import time
+from typing import List, Optional
 from datetime import datetime,timedelta
 from zoneinfo import ZoneInfo
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, and_
+from sqlalchemy.orm import load_only
 
 from app.models.team import Team
 from app.models.article import Article
 from app.models.feed import Feed
 
+from app.services.llm_usage import usage_ledger
+from app.services.bulk_updates import bulk_update_by_ids
+from app.services.article_history import history_recorder
+from app.services.generation_planner import plan_generation, record_outcome
+from app.services.structured_llm import ObjectSpec, StringField, StructuredOutputError, structured_completion
+from app.config import GENERATION_TIME_BUDGET_SECONDS, GENERATION_RUN_TOKEN_BUDGET, LLM_MODEL
+
 from openai import AsyncOpenAI
 
 client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-MODEL = "gpt-3.5-turbo"
+MODEL = LLM_MODEL
+MAX_TOKENS = 1500
+MAX_FEEDS_PER_ARTICLE = 40
+
+# Modalità ridotta quando il budget giornaliero di token è quasi esaurito
+LOW_VOLUME_MIN_FEEDS = 3      # sotto questa soglia un team con articolo già presente viene rimandato
+COMPACT_FEED_CHARS = 600      # testo massimo per feed nel prompt
+COMPACT_MAX_TOKENS = 800
+
+# Limiti validati durante lo streaming: oltre questi la generazione viene interrotta
+TITLE_MAX_CHARS = 255         # Article.title è String(255)
+CONTENT_MIN_CHARS = 200
+CONTENT_MAX_CHARS = 6000      # ~MAX_TOKENS token
+COMPACT_CONTENT_MAX_CHARS = 3200
 
 logger = logging.getLogger("ArticleAIProcessor")
 logger.setLevel(logging.INFO)
@@ -29,57 +50,158 @@ if not logger.hasHandlers():
 class ArticleAIProcessor:
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.compact = False
+        self.tokens_used = 0
+        self.llm_teams = 0
+        self.llm_seconds = 0.0
 
     async def _mark_feeds_as_processed(self, feeds: List[Feed]):
-        for feed in feeds:
-            feed.processed = True
-            self.db.add(feed)
+        # Solo i feed effettivamente inclusi nel prompt: quelli oltre il tetto restano in coda
         try:
-            await self.db.commit()
+            await bulk_update_by_ids(self.db, Feed, [feed.id for feed in feeds], {"processed": True})
         except Exception as e:
             logger.error(f"Errore durante il salvataggio dei feed marcati come processed: {e}")
-            await self.db.rollback()
 
-    def _normalize_str(self, value: Union[str, List[str], None]) -> str:
-        if isinstance(value, list):
-            return "\n".join(str(v) for v in value)
-        if value is None:
-            return ""
-        return str(value)
+    def _combine_feeds(self, feeds: List[Feed]) -> str:
+        if not self.compact:
+            return "\n\n".join([f"Titolo: {f.title}\nTesto: {f.content}" for f in feeds])
+        return "\n\n".join([f"Titolo: {f.title}\nTesto: {(f.content or '')[:COMPACT_FEED_CHARS]}" for f in feeds])
 
-    async def process_all_teams(self):
+    async def process_all_teams(self, team_ids: Optional[List[int]] = None):
+        """
+        Processa i team con feed nuovi in ordine di priorità (vedi generation_planner),
+        finché restano tempo e token del run. I team esclusi passano al run successivo con priorità maggiore.
+
+        :param team_ids: limita la generazione a questi team (es. lo shard del worker)
+        """
         try:
-            teams = (await self.db.execute(select(Team))).scalars().all()
+            plans = await plan_generation(self.db, team_ids)
+            budget = await usage_ledger.budget_status(self.db)
         except Exception as e:
             logger.error(f"Errore nel caricamento delle squadre: {e}")
             return
 
-        for team in teams:
+        if budget.exhausted:
+            logger.warning(f"Budget giornaliero LLM esaurito ({budget.used}/{budget.budget} token). Generazione rimandata.")
+            await self._record_outcome([], [plan.team.id for plan in plans], team_ids)
+            return
+        if budget.near_limit:
+            logger.warning(f"Budget giornaliero LLM quasi esaurito ({budget.used}/{budget.budget} token). Modalità ridotta.")
+            self.compact = True
+
+        # Il budget del run è locale; quello giornaliero viene riletto dal ledger tra un team e l'altro,
+        # così job concorrenti e altri shard consumano lo stesso budget
+        token_budget = GENERATION_RUN_TOKEN_BUDGET
+        deadline = time.monotonic() + GENERATION_TIME_BUDGET_SECONDS if GENERATION_TIME_BUDGET_SECONDS else None
+
+        logger.info("Ordine di generazione: " + ", ".join(f"{p.team.name} ({p.score:.2f})" for p in plans))
+
+        processed, skipped = [], []
+        # Medie per team calcolate solo sui team che hanno chiamato il modello
+        self.llm_teams, self.llm_seconds = 0, 0.0
+        for plan in plans:
+            team = plan.team
+            if self.llm_teams and budget.budget:
+                try:
+                    budget = await usage_ledger.budget_status(self.db)
+                except Exception as e:
+                    logger.error(f"Errore nella lettura del budget giornaliero LLM: {e}")
+                    await self.db.rollback()
+                if budget.near_limit and not self.compact:
+                    logger.warning(f"Budget giornaliero LLM quasi esaurito ({budget.used}/{budget.budget} token). Modalità ridotta.")
+                    self.compact = True
+            if self._out_of_budget(deadline, token_budget, budget):
+                logger.info(f"[Team {team.name}] Budget del run esaurito. Rimandato al prossimo run.")
+                skipped.append(team.id)
+                continue
+
             try:
                 article = await self._get_article_for_team(team.id)
                 new_feeds = await self._get_unprocessed_feeds_for_team(team.id)
 
-                if not article and not new_feeds:
-                    logger.info(f"[Team {team.name}] Nessun articolo e nessun feed nuovo. Passo al prossimo team.")
+                if not new_feeds:
                     continue
 
-                if not article and new_feeds:
+                if not article:
                     logger.info(f"[Team {team.name}] Nessun articolo ma feed nuovi trovati. Generazione articolo ex novo.")
-                    await self._generate_new_article(team, new_feeds)
+                    if await self._timed(self._generate_new_article(team, new_feeds)):
+                        processed.append(team.id)
                     continue
 
-                if article and not new_feeds:
-                    logger.info(f"[Team {team.name}] Articolo esiste, nessun feed nuovo. Nessun aggiornamento necessario.")
+                if self.compact and len(new_feeds) < LOW_VOLUME_MIN_FEEDS:
+                    logger.info(f"[Team {team.name}] Budget ridotto, solo {len(new_feeds)} feed nuovi. Aggiornamento rimandato.")
+                    skipped.append(team.id)
                     continue
 
-                if article and new_feeds:
-                    logger.info(f"[Team {team.name}] Articolo esiste e feed nuovi trovati. Aggiornamento articolo.")
-                    await self._update_existing_article(article, new_feeds)
+                logger.info(f"[Team {team.name}] Articolo esiste e feed nuovi trovati. Aggiornamento articolo.")
+                if await self._timed(self._update_existing_article(article, new_feeds)):
+                    processed.append(team.id)
 
             except Exception as e:
                 logger.error(f"[Team {team.name}] Errore durante il processamento: {e}")
                 await self.db.rollback()
 
+        await self._record_outcome(processed, skipped, team_ids)
+
+    async def _timed(self, call) -> bool:
+        start = time.monotonic()
+        try:
+            return await call
+        finally:
+            self.llm_teams += 1
+            self.llm_seconds += time.monotonic() - start
+
+    def _out_of_budget(self, deadline: Optional[float], token_budget: int, budget) -> bool:
+        """
+        Vero se il prossimo team, stimato sulla media dei team che hanno chiamato il modello,
+        sforerebbe il tempo, i token del run o il budget giornaliero (letto dal ledger condiviso).
+        """
+        if budget.exhausted:
+            return True
+        if not self.llm_teams:
+            return False
+        per_team = self.tokens_used / self.llm_teams
+        if deadline is not None and time.monotonic() + self.llm_seconds / self.llm_teams > deadline:
+            return True
+        if token_budget and self.tokens_used + per_team > token_budget:
+            return True
+        if budget.budget and budget.used + per_team > budget.budget:
+            return True
+        return False
+
+    async def _record_outcome(self, processed: List[int], skipped: List[int], team_ids: Optional[List[int]]):
+        try:
+            await record_outcome(self.db, processed, skipped, team_ids)
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio dello stato di schedulazione: {e}")
+            await self.db.rollback()
+
+    def _article_spec(self) -> ObjectSpec:
+        return ObjectSpec("article", {
+            "title": StringField(min_length=5, max_length=TITLE_MAX_CHARS),
+            "content": StringField(min_length=CONTENT_MIN_CHARS,
+                                   max_length=COMPACT_CONTENT_MAX_CHARS if self.compact else CONTENT_MAX_CHARS),
+        })
+
+    async def _complete_article(self, call_site: str, prompt: str, team_id: int, label: str) -> Optional[dict]:
+        """Articolo validato dal modello, oppure None (nessun articolo vuoto o di ripiego viene salvato)."""
+        try:
+            result = await structured_completion(
+                client, call_site, MODEL, prompt, self._article_spec(),
+                max_tokens=COMPACT_MAX_TOKENS if self.compact else MAX_TOKENS,
+                temperature=0.7,
+                team_id=team_id,
+            )
+        except StructuredOutputError as e:
+            self.tokens_used += getattr(e, "tokens", 0)
+            logger.error(f"[Team {label}] Risposta OpenAI non valida anche dopo il secondo tentativo: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"[Team {label}] Errore OpenAI durante {call_site}: {e}")
+            return None
+        self.tokens_used += result.tokens
+        return result.data
+
     async def _get_article_for_team(self, team_id: int):
         result = await self.db.execute(
             select(Article).where(Article.team_id == team_id)
@@ -87,30 +209,19 @@ class ArticleAIProcessor:
         return result.scalars().first()
 
     async def _get_unprocessed_feeds_for_team(self, team_id: int) -> List[Feed]:
+        # Solo le colonne usate nel prompt, e al massimo MAX_FEEDS_PER_ARTICLE feed (i più recenti):
+        # dopo un lungo fermo i più vecchi restano non processati e vengono ripresi nei run successivi
         result = await self.db.execute(
-            select(Feed).where(Feed.team_id == team_id, Feed.processed == False)
+            select(Feed)
+            .options(load_only(Feed.id, Feed.title, Feed.content))
+            .where(Feed.team_id == team_id, Feed.processed == False)
+            .order_by(Feed.published_at.desc())
+            .limit(MAX_FEEDS_PER_ARTICLE)
         )
         return result.scalars().all()
 
-    async def _parse_openai_response(self, raw_content: str, team_name: str) -> dict:
-        try:
-            data = json.loads(raw_content)
-            if isinstance(data, list):
-                if len(data) > 0 and isinstance(data[0], dict):
-                    data = data[0]
-                else:
-                    logger.warning(f"[Team {team_name}] OpenAI response is a list but does not contain dict, using empty dict.")
-                    data = {}
-            elif not isinstance(data, dict):
-                logger.warning(f"[Team {team_name}] OpenAI response is not a dict, got {type(data)}, using empty dict.")
-                data = {}
-            return data
-        except json.JSONDecodeError as e:
-            logger.error(f"[Team {team_name}] JSONDecodeError parsing OpenAI response: {e}")
-            return {}
-
-    async def _generate_new_article(self, team: Team, feeds: List[Feed]):
-        combined_text = "\n\n".join([f"Titolo: {f.title}\nTesto: {f.content}" for f in feeds])
+    async def _generate_new_article(self, team: Team, feeds: List[Feed]) -> bool:
+        combined_text = self._combine_feeds(feeds)
         prompt = (
             f"Sei un giornalista sportivo esperto di calciomercato.\n"
             "Ti fornisco alcuni feed di notizie.\n"
@@ -122,43 +233,36 @@ class ArticleAIProcessor:
             "5. Non usare frasi sensazionalistiche.\n"
             "6. Usa frasi diverse tra loro, evita ripetizioni.\n"
             f"Feed:\n{combined_text}\n\n"
-            "Rispondi esclusivamente con un singolo oggetto JSON valido, senza testo aggiuntivo o spiegazioni, "
-            "nel formato {'title': ..., 'content': ...}."
+            "Rispondi con il titolo (title) e il testo (content) dell'articolo."
         )
-        try:
-            response = await client.chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=1500,
-            )
-            raw_content = response.choices[0].message.content
-            data = await self._parse_openai_response(raw_content, team.name)
-            logger.info(f"[Team {team.name}] Articolo generato con successo.")
-            await self._mark_feeds_as_processed(feeds)
-
-        except Exception as e:
-            logger.error(f"[Team {team.name}] Errore OpenAI durante generazione articolo: {e}")
-            data = {"title": f"Aggiornamenti {team.name}", "content": "Errore nella generazione dell'articolo."}
+        data = await self._complete_article("article_generate", prompt, team.id, team.name)
+        if data is None:
+            # I feed restano da processare: verranno ripresi al prossimo run
+            return False
+        logger.info(f"[Team {team.name}] Articolo generato con successo.")
 
         try:
-            title = self._normalize_str(data.get("title", f"Aggiornamenti {team.name}"))
-            content = self._normalize_str(data.get("content", ""))
             new_article = Article(
                 team_id=team.id,
-                title=title,
-                content=content,
+                title=data["title"],
+                content=data["content"],
                 last_updated=datetime.now(ZoneInfo("Europe/Rome")) + timedelta(hours=2)
             )
             self.db.add(new_article)
             await self.db.commit()
+            history_recorder.record_later(new_article.id, team.id, new_article.title, new_article.content)
             logger.info(f"[Team {team.name}] Articolo salvato correttamente.")
         except Exception as e:
             logger.error(f"[Team {team.name}] Errore durante il salvataggio articolo: {e}")
             await self.db.rollback()
+            return False
+
+        # Solo ora che l'articolo è salvato i feed risultano processati
+        await self._mark_feeds_as_processed(feeds)
+        return True
 
-    async def _update_existing_article(self, article: Article, feeds: List[Feed]):
-        combined_new_text = "\n\n".join([f"Titolo: {f.title}\nTesto: {f.content}" for f in feeds])
+    async def _update_existing_article(self, article: Article, feeds: List[Feed]) -> bool:
+        combined_new_text = self._combine_feeds(feeds)
         prompt = (
             f"Sei un giornalista sportivo esperto di calciomercato.\n"
             "Ti fornisco alcuni feed di notizie.\n"
@@ -170,34 +274,28 @@ class ArticleAIProcessor:
             "5. Non usare frasi sensazionalistiche.\n"
             "6. Usa frasi diverse tra loro, evita ripetizioni.\n"
             f"feed_nuovi:\n{combined_new_text}\n\n"
-            "Rispondi esclusivamente con un singolo oggetto JSON valido, senza testo aggiuntivo o spiegazioni, "
-            "nel formato {'title': ..., 'content': ...}."
+            "Rispondi con il titolo (title) e il testo (content) dell'articolo."
         )
-        try:
-            response = await client.chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=1500,
-            )
-            raw_content = response.choices[0].message.content
-            data = await self._parse_openai_response(raw_content, f"team_id {article.team_id}")
-            logger.info(f"[Team {article.team_id}] Articolo aggiornato con successo.")
-            await self._mark_feeds_as_processed(feeds)
-
-        except Exception as e:
-            logger.error(f"[Team {article.team_id}] Errore OpenAI durante aggiornamento articolo: {e}")
-            data = {"title": article.title, "content": article.content}
+        data = await self._complete_article("article_update", prompt, article.team_id, f"team_id {article.team_id}")
+        if data is None:
+            # Articolo e feed restano invariati: verranno ripresi al prossimo run
+            return False
+        logger.info(f"[Team {article.team_id}] Articolo aggiornato con successo.")
 
         try:
-            article.title = self._normalize_str(data.get("title", article.title))
-            article.content = self._normalize_str(data.get("content", article.content))
+            article.title = data["title"]
+            article.content = data["content"]
             article.last_updated = datetime.now(ZoneInfo("Europe/Rome")) + timedelta(hours=2)
             await self.db.commit()
+            history_recorder.record_later(article.id, article.team_id, article.title, article.content)
             logger.info(f"[Team {article.team_id}] Articolo aggiornato salvato correttamente.")
         except Exception as e:
             logger.error(f"[Team {article.team_id}] Errore durante il salvataggio aggiornamento articolo: {e}")
             await self.db.rollback()
+            return False
+
+        await self._mark_feeds_as_processed(feeds)
+        return True
 
     async def cleanup_feeds(self):
         try:
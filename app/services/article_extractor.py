@@ -1,14 +1,22 @@
 # article_extractor.py
 import logging
 import requests
+from typing import List, Optional
 from newspaper import Article
 from bs4 import BeautifulSoup
 from sqlalchemy import select
+from sqlalchemy.orm import load_only
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.feed import Feed
+from app.metrics import FEEDS_TOTAL, time_extraction
+from app.services.bulk_updates import bulk_update_values
+from app.services.batch_iter import iter_batches
 
 logger = logging.getLogger("FeedContentFetcher")
 
+# Contenuti estratti accumulati prima di ogni scrittura su DB
+FLUSH_EVERY = 50
+
 class FeedContentFetcher:
     """
     Classe incaricata di arricchire i feed non processati,
@@ -18,49 +26,66 @@ class FeedContentFetcher:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def enrich_feed_content(self) -> int:
-        result = await self.db.execute(
-            select(Feed).where(
+    async def enrich_feed_content(self, team_ids: Optional[List[int]] = None) -> int:
+        """
+        :param team_ids: limita l'enrichment ai feed di questi team (es. lo shard del worker)
+        """
+        # Servono solo id e link: content/summary restano sul DB
+        stmt = (
+            select(Feed)
+            .options(load_only(Feed.id, Feed.link))
+            .where(
                 Feed.processed == False,
                 Feed.team_id.isnot(None),
                 (Feed.content == None) | (Feed.content == "")
             )
+            .order_by(Feed.id)
         )
-        feeds = result.scalars().all()
+        if team_ids is not None:
+            stmt = stmt.where(Feed.team_id.in_(team_ids))
         updated_count = 0
+        pending = []
 
-        for feed in feeds:
-            try:
-                logger.info(f"Feed ID {feed.id} - Link dal DB: {repr(feed.link)}")
-                resolved_url = self.resolve_final_url(feed.link)
-                logger.info(f"Feed ID {feed.id} - Link risolto: {repr(resolved_url)}")
+        async for feeds in iter_batches(stmt):
+            for feed in feeds:
+                try:
+                    logger.info(f"Feed ID {feed.id} - Link dal DB: {repr(feed.link)}")
+                    resolved_url = self.resolve_final_url(feed.link)
+                    logger.info(f"Feed ID {feed.id} - Link risolto: {repr(resolved_url)}")
 
-                content = self.extract_article_content(resolved_url)
-                if content and len(content) > 100:
-                    feed.content = content
-                    feed.processed = True
-                    self.db.add(feed)
-                    updated_count += 1
-                else:
-                    logger.warning(f"Feed ID {feed.id} - Contenuto troppo corto o vuoto")
-            except Exception as e:
-                logger.warning(f"Errore su feed ID {feed.id}: {e}")
+                    content = self.extract_article_content(resolved_url)
+                    if content and len(content) > 100:
+                        pending.append({"id": feed.id, "content": content, "processed": True})
+                    else:
+                        logger.warning(f"Feed ID {feed.id} - Contenuto troppo corto o vuoto")
+                except Exception as e:
+                    logger.warning(f"Errore su feed ID {feed.id}: {e}")
 
-        if updated_count > 0:
-            try:
-                await self.db.commit()
-                logger.info(f"Commit effettuato, {updated_count} feed aggiornati.")
-            except Exception as e:
-                logger.error(f"Errore durante il commit: {e}")
-                await self.db.rollback()
-                return 0
+                if len(pending) >= FLUSH_EVERY:
+                    updated_count += await self._save_contents(pending)
+                    pending = []
 
+        updated_count += await self._save_contents(pending)
         return updated_count
 
+    async def _save_contents(self, pending: list) -> int:
+        """Scrive un blocco di contenuti estratti con un solo UPDATE ... FROM (VALUES ...)."""
+        if not pending:
+            return 0
+        try:
+            updated = await bulk_update_values(self.db, Feed, pending)
+            FEEDS_TOTAL.labels("extracted").inc(len(pending))
+            logger.info(f"Commit effettuato, {len(pending)} feed aggiornati.")
+            return updated
+        except Exception as e:
+            logger.error(f"Errore durante il commit: {e}")
+            return 0
+
     def resolve_final_url(self, url: str) -> str:
         try:
             logger.info(f"Resolving URL: {repr(url)}")
-            response = requests.head(url, allow_redirects=True, timeout=5)
+            with time_extraction("resolve", url):
+                response = requests.head(url, allow_redirects=True, timeout=5)
             final_url = response.url
             logger.info(f"Resolved final URL: {repr(final_url)}")
             return final_url
@@ -74,9 +99,10 @@ class FeedContentFetcher:
         """
         try:
             logger.info(f"Estrazione contenuto da URL con newspaper: {repr(url)}")
-            article = Article(url)
-            article.download()
-            article.parse()
+            with time_extraction("newspaper", url):
+                article = Article(url)
+                article.download()
+                article.parse()
             if len(article.text) > 100:
                 logger.info(f"Contenuto estratto con newspaper, lunghezza: {len(article.text)}")
                 return article.text
@@ -88,10 +114,11 @@ class FeedContentFetcher:
         # Fallback: BeautifulSoup
         try:
             logger.info(f"Tentativo fallback con BeautifulSoup per URL: {repr(url)}")
-            response = requests.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            paragraphs = soup.find_all('p')
-            text = "\n".join(p.get_text() for p in paragraphs if len(p.get_text()) > 20)
+            with time_extraction("beautifulsoup", url):
+                response = requests.get(url, timeout=10)
+                soup = BeautifulSoup(response.content, 'html.parser')
+                paragraphs = soup.find_all('p')
+                text = "\n".join(p.get_text() for p in paragraphs if len(p.get_text()) > 20)
 
             if len(text) > 100:
                 logger.info(f"Contenuto estratto con fallback BeautifulSoup, lunghezza: {len(text)}")
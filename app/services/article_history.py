@@ -0,0 +1,188 @@
+# app/services/article_history.py
+#
+# Storico compatto degli articoli: ogni versione salvata da ArticleAIProcessor viene
+# registrata come keyframe (testo completo compresso) ogni KEYFRAME_INTERVAL versioni,
+# e nel mezzo come delta compresso rispetto alla versione precedente.
+# La scrittura avviene in background dopo il commit dell'articolo.
+
+import asyncio
+import difflib
+import json
+import logging
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import async_session
+from app.models.article_history import ArticleHistory
+
+logger = logging.getLogger("article_history")
+
+KEYFRAME_INTERVAL = 24  # con aggiornamenti orari, circa un keyframe al giorno
+
+_TOKEN_RE = re.compile(r"\s+|[^\s]+")
+
+
+def _tokens(text: str) -> List[str]:
+    # Parole e spazi alternati: il diff lavora su parole, la ricostruzione è esatta
+    return _TOKEN_RE.findall(text)
+
+
+def _serialize(title: str, content: str) -> str:
+    return json.dumps({"title": title or "", "content": content or ""}, ensure_ascii=False)
+
+
+def encode_keyframe(document: str) -> bytes:
+    return zlib.compress(document.encode("utf-8"), 9)
+
+
+def encode_delta(previous: str, current: str) -> bytes:
+    """Delta come lista di operazioni: [inizio, fine] copia token dalla versione precedente, "testo" inserisce."""
+    prev_tokens, curr_tokens = _tokens(previous), _tokens(current)
+    matcher = difflib.SequenceMatcher(None, prev_tokens, curr_tokens, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(curr_tokens[j1:j2]))
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def apply_delta(previous: str, payload: bytes) -> str:
+    prev_tokens = _tokens(previous)
+    parts = []
+    for op in json.loads(zlib.decompress(payload).decode("utf-8")):
+        if isinstance(op, list):
+            parts.extend(prev_tokens[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return "".join(parts)
+
+
+def _replay(rows: List[ArticleHistory]) -> str:
+    """Ricostruisce il documento dell'ultima riga a partire dal primo keyframe della lista."""
+    document = None
+    for row in rows:
+        if row.is_keyframe:
+            document = zlib.decompress(row.payload).decode("utf-8")
+        elif document is not None:
+            document = apply_delta(document, row.payload)
+    if document is None:
+        raise ValueError("Catena di versioni senza keyframe")
+    return document
+
+
+async def _load_chain(db: AsyncSession, article_id: int, version: int) -> List[ArticleHistory]:
+    """Righe dall'ultimo keyframe <= version fino a version inclusa."""
+    keyframe_version = (await db.execute(
+        select(func.max(ArticleHistory.version)).where(
+            ArticleHistory.article_id == article_id,
+            ArticleHistory.is_keyframe == True,
+            ArticleHistory.version <= version,
+        )
+    )).scalar_one_or_none()
+    if keyframe_version is None:
+        return []
+
+    result = await db.execute(
+        select(ArticleHistory)
+        .where(
+            ArticleHistory.article_id == article_id,
+            ArticleHistory.version >= keyframe_version,
+            ArticleHistory.version <= version,
+        )
+        .order_by(ArticleHistory.version)
+    )
+    return list(result.scalars().all())
+
+
+async def reconstruct_version(db: AsyncSession, article_id: int, version: int) -> Optional[dict]:
+    rows = await _load_chain(db, article_id, version)
+    if not rows or rows[-1].version != version:
+        return None
+    document = json.loads(_replay(rows))
+    return {"version": version, "created_at": rows[-1].created_at, **document}
+
+
+async def list_versions(db: AsyncSession, article_id: int) -> List[dict]:
+    result = await db.execute(
+        select(
+            ArticleHistory.version,
+            ArticleHistory.created_at,
+            ArticleHistory.is_keyframe,
+            ArticleHistory.raw_size,
+            func.length(ArticleHistory.payload).label("stored_size"),
+        )
+        .where(ArticleHistory.article_id == article_id)
+        .order_by(ArticleHistory.version.desc())
+    )
+    return [dict(row) for row in result.mappings().all()]
+
+
+class ArticleHistoryRecorder:
+    """Registra le versioni in background, serializzando le scritture per articolo."""
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._tasks = set()
+        # Ultima versione nota per articolo, evita di ricostruirla dal DB a ogni aggiornamento
+        self._latest: Dict[int, Tuple[int, str]] = {}
+
+    def record_later(self, article_id: int, team_id: Optional[int], title: str, content: str) -> None:
+        task = asyncio.get_running_loop().create_task(self.record(article_id, team_id, title, content))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        """Attende le scritture in corso (fine job, shutdown)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def record(self, article_id: int, team_id: Optional[int], title: str, content: str) -> None:
+        lock = self._locks.setdefault(article_id, asyncio.Lock())
+        async with lock:
+            try:
+                async with async_session() as db:
+                    await self._record(db, article_id, team_id, _serialize(title, content))
+            except Exception as e:
+                self._latest.pop(article_id, None)
+                logger.error(f"[ArticleHistory] Errore nel salvataggio della versione per articolo {article_id}: {e}")
+
+    async def _record(self, db: AsyncSession, article_id: int, team_id: Optional[int], document: str) -> None:
+        last_version = (await db.execute(
+            select(func.max(ArticleHistory.version)).where(ArticleHistory.article_id == article_id)
+        )).scalar_one_or_none() or 0
+
+        previous = None
+        if last_version:
+            cached = self._latest.get(article_id)
+            if cached and cached[0] == last_version:
+                previous = cached[1]
+            else:
+                rows = await _load_chain(db, article_id, last_version)
+                previous = _replay(rows) if rows else None
+
+        if previous == document:
+            return
+
+        version = last_version + 1
+        is_keyframe = previous is None or (version - 1) % KEYFRAME_INTERVAL == 0
+        payload = encode_keyframe(document) if is_keyframe else encode_delta(previous, document)
+
+        db.add(ArticleHistory(
+            article_id=article_id,
+            team_id=team_id,
+            version=version,
+            is_keyframe=is_keyframe,
+            payload=payload,
+            raw_size=len(document.encode("utf-8")),
+        ))
+        await db.commit()
+        self._latest[article_id] = (version, document)
+
+
+history_recorder = ArticleHistoryRecorder()
@@ -0,0 +1,55 @@
+# app/services/batch_iter.py
+#
+# Iterazione a blocchi per le query dei job: paginazione keyset (WHERE id > :ultimo
+# ORDER BY id LIMIT :blocco), ogni blocco in una sessione breve e dedicata. Nessun cursore
+# lato server né transazione resta aperta mentre il chiamante elabora il blocco (HTTP,
+# chiamate LLM), e i servizi possono committare i propri aggiornamenti sulla sessione
+# principale. Funziona anche dietro PgBouncer in transaction pooling, dove i portali
+# nominati di un cursore non sopravvivono tra uno statement e l'altro.
+
+from typing import AsyncIterator, List
+
+from app.db import async_session
+
+DEFAULT_BATCH_SIZE = 200
+
+
+async def iter_batches(stmt, batch_size: int = DEFAULT_BATCH_SIZE, scalars: bool = True,
+                       key=None, session_factory=async_session) -> AsyncIterator[List]:
+    """
+    Restituisce i risultati di `stmt` a blocchi di al massimo `batch_size` elementi, in ordine di `key`.
+    La memoria resta proporzionale al blocco, non al numero totale di righe.
+    Limitare le colonne nella query stessa (load_only / defer o select di colonne).
+
+    Le righe aggiornate dal chiamante tra un blocco e l'altro non vengono rilette né saltate:
+    ogni blocco riparte dall'ultima chiave vista.
+
+    :param scalars: True per entità o singola colonna, False per righe con più colonne
+        (in questo caso `key` deve essere tra le colonne selezionate)
+    :param key: colonna univoca e indicizzata su cui paginare; di default la colonna `id`
+        della prima entità selezionata
+    """
+    if key is None:
+        key = stmt.column_descriptions[0]["entity"].id
+    # L'ordine della query originale viene sostituito da quello della chiave
+    stmt = stmt.order_by(None).order_by(key).limit(batch_size)
+    if scalars:
+        stmt = stmt.add_columns(key)
+
+    last = None
+    while True:
+        page = stmt if last is None else stmt.where(key > last)
+        async with session_factory() as session:
+            rows = (await session.execute(page)).all()
+        if not rows:
+            return
+
+        if scalars:
+            last = rows[-1][-1]
+            yield [row[0] for row in rows]
+        else:
+            last = getattr(rows[-1], key.key)
+            yield rows
+
+        if len(rows) < batch_size:
+            return
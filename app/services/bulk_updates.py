@@ -0,0 +1,101 @@
+# app/services/bulk_updates.py
+#
+# Aggiornamenti set-based condivisi dai servizi: invece di modificare e committare
+# gli oggetti ORM uno per uno, si emette un UPDATE per blocco di righe e un commit per blocco.
+
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import any_, bindparam, column, update, values
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def chunked(items: Sequence, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _is_postgres(db: AsyncSession) -> bool:
+    return db.bind.dialect.name == "postgresql"
+
+
+def _id_filter(db: AsyncSession, model, ids: List[int]):
+    id_column = model.__table__.c.id
+    if _is_postgres(db):
+        # WHERE id = ANY(:ids): un solo parametro array, piano stabile a prescindere dal numero di id
+        return id_column == any_(bindparam("ids", value=ids, type_=ARRAY(id_column.type)))
+    return id_column.in_(ids)
+
+
+async def bulk_update_by_ids(db: AsyncSession, model, ids: Iterable[int], new_values: dict,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Imposta gli stessi valori su tutte le righe con id in `ids`:
+    UPDATE ... SET ... WHERE id = ANY(:ids), un commit per blocco di `chunk_size` id.
+
+    :return: numero di righe aggiornate
+    """
+    ids = list(dict.fromkeys(ids))
+    updated = 0
+    for chunk in chunked(ids, chunk_size):
+        stmt = (
+            update(model.__table__)
+            .where(_id_filter(db, model, chunk))
+            .values(**new_values)
+        )
+        try:
+            result = await db.execute(stmt)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        updated += result.rowcount
+    return updated
+
+
+async def bulk_update_values(db: AsyncSession, model, rows: List[dict],
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Aggiorna valori diversi per ogni riga. Ogni dict contiene "id" e le stesse colonne da impostare.
+    Su PostgreSQL: UPDATE ... FROM (VALUES ...) AS v WHERE id = v.id, un commit per blocco.
+    Sugli altri dialetti (es. SQLite nei benchmark) ripiega sull'executemany per chiave primaria.
+
+    :return: numero di righe aggiornate
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    names = ["id"] + [name for name in rows[0] if name != "id"]
+    updated = 0
+
+    for chunk in chunked(rows, chunk_size):
+        if _is_postgres(db):
+            v = values(*[column(name, table.c[name].type) for name in names], name="v").data(
+                [tuple(row[name] for name in names) for row in chunk]
+            )
+            stmt = (
+                update(table)
+                .where(table.c.id == v.c.id)
+                .values({name: v.c[name] for name in names[1:]})
+            )
+            params = None
+        else:
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values({name: bindparam(f"_{name}") for name in names[1:]})
+            )
+            # I bindparam non possono avere lo stesso nome delle colonne in SET
+            params = [{f"_{name}": row[name] for name in names} for row in chunk]
+
+        try:
+            result = await db.execute(stmt, params) if params else await db.execute(stmt)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        updated += result.rowcount if result.rowcount >= 0 else len(chunk)
+    return updated
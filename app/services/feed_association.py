@@ -1,76 +1,119 @@
 # app/services/feed_association.py
 
 import os
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import load_only
 from app.models.feed import Feed
 from app.services.team_service import get_all_teams
+from app.metrics import FEEDS_TOTAL
+from app.config import LLM_MODEL
+from app.services.structured_llm import ObjectSpec, StringField, StructuredOutputError, structured_completion
+from app.services.bulk_updates import bulk_update_by_ids, bulk_update_values
+from app.services.batch_iter import iter_batches
 from openai import AsyncOpenAI
 
+# Esiti di associazione accumulati prima di ogni scrittura su DB
+FLUSH_EVERY = 50
+
+# Risposta {"team": "..."}: bastano pochi token, un nome fuori elenco interrompe lo stream
+MAX_TOKENS = 30
+NO_TEAM = "None"
+
 class FeedTeamAssociatorAI:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-3.5-turbo"
+        self.model = LLM_MODEL
 
-    async def _get_unassigned_unprocessed_feeds(self):
-        result = await self.db.execute(
-            select(Feed).where(Feed.team_id == None, Feed.processed == False)
+    def _unassigned_unprocessed_feeds_stmt(self, partition: Optional[Tuple[int, int]] = None):
+        # Per il prompt bastano titolo, contenuto e summary (per le entry multi-team senza contenuto)
+        stmt = (
+            select(Feed)
+            .options(load_only(Feed.id, Feed.title, Feed.content, Feed.summary))
+            .where(Feed.team_id == None, Feed.processed == False)
+            .order_by(Feed.id)
         )
-        return result.scalars().all()
+        if partition is not None:
+            index, count = partition
+            stmt = stmt.where(Feed.id % count == index)
+        return stmt
+
+    async def associate_feeds(self, partition: Optional[Tuple[int, int]] = None):
+        """
+        :param partition: (indice, totale) per spartire i feed senza team tra più worker
+        """
+        teams = await get_all_teams(self.db)
+        team_names = [team.name for team in teams]
+        spec = ObjectSpec("feed_team", {"team": StringField(enum=team_names + [NO_TEAM])})
 
-    async def associate_feeds(self):
-        feeds = await self._get_unassigned_unprocessed_feeds()
-        if not feeds:
+        assignments: List[dict] = []
+        unmatched_ids: List[int] = []
+        seen = 0
+
+        async for feeds in iter_batches(self._unassigned_unprocessed_feeds_stmt(partition)):
+            for feed in feeds:
+                seen += 1
+                await self._associate_feed(feed, teams, team_names, spec, assignments, unmatched_ids)
+
+                if len(assignments) + len(unmatched_ids) >= FLUSH_EVERY:
+                    await self._flush(assignments, unmatched_ids)
+                    assignments, unmatched_ids = [], []
+
+        if not seen:
             print("[FeedTeamAssociatorAI] Nessun feed non associato e non processato trovato.")
             return
 
-        teams = await get_all_teams(self.db)
-        team_names = [team.name for team in teams]
+        await self._flush(assignments, unmatched_ids)
+
+    async def _associate_feed(self, feed: Feed, teams, team_names: List[str], spec: ObjectSpec,
+                              assignments: List[dict], unmatched_ids: List[int]):
+        prompt = (
+            "Sei un assistente che associa un feed di notizie sportive a uno dei seguenti team: "
+            f"{', '.join(team_names)}.\n"
+            "Leggi questo feed:\n"
+            f"Titolo: {feed.title}\n"
+            f"Contenuto: {feed.content or feed.summary}\n\n"
+            f"Rispondi con il nome del team a cui associare questo feed, oppure '{NO_TEAM}' se nessun team è rilevante."
+        )
 
-        for feed in feeds:
-            prompt = (
-                "Sei un assistente che associa un feed di notizie sportive a uno dei seguenti team: "
-                f"{', '.join(team_names)}.\n"
-                "Leggi questo feed:\n"
-                f"Titolo: {feed.title}\n"
-                f"Contenuto: {feed.content}\n\n"
-                "Rispondi solo con il nome del team a cui associare questo feed, oppure 'None' se nessun team è rilevante."
+        try:
+            result = await structured_completion(
+                self.client, "feed_association", self.model, prompt, spec,
+                max_tokens=MAX_TOKENS, temperature=0.0,
             )
+        except StructuredOutputError as e:
+            # Risposta fuori schema anche al secondo tentativo: riprovare a ogni run costerebbe due
+            # chiamate per run fino alla scadenza di 24h, il feed viene chiuso senza team
+            unmatched_ids.append(feed.id)
+            print(f"[{feed.id}] Risposta AI non valida durante associazione team, feed marcato come processato senza team: {e}")
+            return
+        except Exception as e:
+            print(f"[{feed.id}] Errore AI durante associazione team: {e}")
+            return
+
+        team_name_ai = result.data["team"]
+        team_obj = next((t for t in teams if t.name == team_name_ai), None)
 
-            try:
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.0,
-                    max_tokens=10,
-                )
-                team_name_ai = response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"[{feed.id}] Errore AI durante associazione team: {e}")
-                continue
-
-            if team_name_ai == "None" or team_name_ai not in team_names:
-                # Segna come processato senza team
-                try:
-                    feed.processed = True
-                    await self.db.commit()
-                    print(f"[{feed.id}] Feed marcato come processato senza team.")
-                except Exception as e:
-                    print(f"[{feed.id}] Errore aggiornamento feed processato: {e}")
-                    await self.db.rollback()
-                continue
-
-            team_obj = next((t for t in teams if t.name == team_name_ai), None)
-            if not team_obj:
-                print(f"[{feed.id}] Team '{team_name_ai}' non trovato nella lista team.")
-                continue
-
-            try:
-                feed.team_id = team_obj.id
-                feed.processed = True
-                await self.db.commit()
-                print(f"[{feed.id}] Feed associato al team '{team_name_ai}'.")
-            except Exception as e:
-                print(f"[{feed.id}] Errore salvataggio associazione team: {e}")
-                await self.db.rollback()
+        if team_obj is None:
+            # Segna come processato senza team
+            unmatched_ids.append(feed.id)
+            print(f"[{feed.id}] Feed da marcare come processato senza team.")
+        else:
+            assignments.append({"id": feed.id, "team_id": team_obj.id, "processed": True})
+            print(f"[{feed.id}] Feed da associare al team '{team_name_ai}'.")
+
+    async def _flush(self, assignments: List[dict], unmatched_ids: List[int]):
+        """Salva un blocco di esiti con due UPDATE set-based invece di un commit per feed."""
+        if not assignments and not unmatched_ids:
+            return
+        try:
+            if assignments:
+                await bulk_update_values(self.db, Feed, assignments)
+                FEEDS_TOTAL.labels("associated").inc(len(assignments))
+            if unmatched_ids:
+                await bulk_update_by_ids(self.db, Feed, unmatched_ids, {"processed": True})
+            print(f"[FeedTeamAssociatorAI] Salvati {len(assignments)} feed associati e {len(unmatched_ids)} senza team.")
+        except Exception as e:
+            print(f"[FeedTeamAssociatorAI] Errore salvataggio blocco associazioni: {e}")
@@ -2,10 +2,13 @@ import datetime
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.feed import Feed
+from app.services.bulk_updates import bulk_update_by_ids, DEFAULT_CHUNK_SIZE
+from app.services.batch_iter import iter_batches
 
 async def sgr_ezza_feeds(db: AsyncSession) -> int:
     """
     Aggiorna a processed=True tutti i feed non processati con published_at più vecchio di 24 ore.
+    Scorre solo gli id a blocchi (paginazione keyset) e aggiorna con un commit per blocco.
 
     :param db: sessione DB asincrona
     :return: numero di feed aggiornati
@@ -13,20 +16,13 @@ async def sgr_ezza_feeds(db: AsyncSession) -> int:
     now = datetime.datetime.utcnow()
     cutoff = now - datetime.timedelta(hours=24)
 
-    result = await db.execute(
-        select(Feed).where(
-            Feed.processed == False,
-            Feed.published_at < cutoff
-        )
+    stmt = select(Feed.id).where(
+        Feed.processed == False,
+        Feed.published_at < cutoff
     )
-    feeds_to_update = result.scalars().all()
 
     count = 0
-    for feed in feeds_to_update:
-        feed.processed = True
-        count += 1
-
-    if count > 0:
-        await db.commit()
+    async for feed_ids in iter_batches(stmt, batch_size=DEFAULT_CHUNK_SIZE):
+        count += await bulk_update_by_ids(db, Feed, feed_ids, {"processed": True})
 
     return count
@@ -1,10 +1,15 @@
 import feedparser
+import httpx
 import logging
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.feed import Feed
-from app.feed_config.feed_team_map import FEED_TEAM_MAP  # ✅ ora unica fonte
+from app.models.feed_source import FeedSource
+from app.services.feed_source_service import get_enabled_sources
 from app.services.feed_cleanup import sgr_ezza_feeds
+from app.services.stream_ingestion import ingest_stream_source
+from app.metrics import FEEDS_TOTAL
 import datetime
 
 MAX_LEN = 1024
@@ -17,10 +22,32 @@ def truncate_string(s: str, max_len: int = MAX_LEN) -> str:
         return ""
     return s[:max_len]
 
-async def ingest_feeds(db: AsyncSession):
+async def ingest_feeds(db: AsyncSession, sources: Optional[List[FeedSource]] = None, run_cleanup: bool = True):
+    """
+    Scarica le sorgenti RSS (di default tutte quelle abilitate in feed_sources) e inserisce i feed nuovi.
+
+    :param sources: sottoinsieme di sorgenti da leggere, es. quelle dello shard del worker
+    :param run_cleanup: esegue anche sgr_ezza_feeds a fine ingestion
+    """
     new_count = 0
 
-    for rss_url, team_id in FEED_TEAM_MAP.items():
+    if sources is None:
+        sources = await get_enabled_sources(db)
+
+    # Le sorgenti multi-team (team_id None) passano dal parser in streaming
+    stream_sources = [source for source in sources if source.team_id is None]
+    if stream_sources:
+        async with httpx.AsyncClient() as client:
+            for source in stream_sources:
+                try:
+                    new_count += await ingest_stream_source(db, source, client)
+                except Exception as e:
+                    logger.error(f"[FeedIngestion] Errore nello streaming della sorgente {source.url}: {e}")
+
+    for source in sources:
+        if source.team_id is None:
+            continue
+        rss_url, team_id = source.url, source.team_id
         try:
             d = feedparser.parse(rss_url)
             feed_source = truncate_string(rss_url)
@@ -33,12 +60,14 @@ async def ingest_feeds(db: AsyncSession):
                 feed_entry_id = truncate_string(getattr(entry, "id", None) or getattr(entry, "link", ""))
                 if not feed_entry_id:
                     logger.warning(f"[FeedIngestion] Entry senza id/link in feed {rss_url}, skip.")
+                    FEEDS_TOTAL.labels("skipped").inc()
                     continue
 
                 # Evita duplicati
                 result = await db.execute(select(Feed).where(Feed.feed_entry_id == feed_entry_id))
                 existing = result.scalars().first()
                 if existing:
+                    FEEDS_TOTAL.labels("skipped").inc()
                     continue
 
                 title = truncate_string(getattr(entry, "title", ""))
@@ -63,7 +92,7 @@ async def ingest_feeds(db: AsyncSession):
                     content=content,
                     published_at=published_at,
                     processed=False,
-                    team_id=team_id  # ✅ già noto dalla mappa
+                    team_id=team_id  # ✅ già noto dalla sorgente
                 )
 
                 db.add(new_feed)
@@ -75,10 +104,14 @@ async def ingest_feeds(db: AsyncSession):
 
     try:
         await db.commit()
+        FEEDS_TOTAL.labels("ingested").inc(new_count)
         logger.info(f"[FeedIngestion] Inseriti {new_count} nuovi feed.")
     except Exception as e:
         logger.error(f"[FeedIngestion] Errore durante commit DB: {e}")
     
+    if not run_cleanup:
+        return
+
     try:
         sgrezzati = await sgr_ezza_feeds(db)
         logger.info(f"[FeedIngestion] Sgrezzati {sgrezzati} feed più vecchi di 24h.")
@@ -0,0 +1,42 @@
+# app/services/feed_source_service.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func
+from app.models.feed_source import FeedSource
+from app.feed_config.feed_team_map import FEED_TEAM_MAP
+from app.config import RSS_FEEDS
+
+async def get_enabled_sources(db: AsyncSession):
+    result = await db.execute(
+        select(FeedSource).where(FeedSource.enabled == True).order_by(FeedSource.id)
+    )
+    return result.scalars().all()
+
+async def add_feed_source(db: AsyncSession, url: str, team_id: int = None) -> FeedSource:
+    source = FeedSource(url=url, team_id=team_id)
+    db.add(source)
+    await db.commit()
+    return source
+
+async def seed_feed_sources(db: AsyncSession) -> int:
+    """
+    Al primo avvio copia FEED_TEAM_MAP nella tabella feed_sources; da lì in poi le sorgenti
+    di team si gestiscono sul DB e la mappa resta solo come seed.
+    Le sorgenti generaliste di feeds.json (RSS_FEEDS) vengono aggiunte come multi-team
+    (team_id None) se mancano.
+    """
+    seeded = 0
+    count = (await db.execute(select(func.count()).select_from(FeedSource))).scalar_one()
+    if not count:
+        db.add_all([FeedSource(url=url, team_id=team_id) for url, team_id in FEED_TEAM_MAP.items()])
+        seeded += len(FEED_TEAM_MAP)
+
+    existing = set((await db.execute(select(FeedSource.url).where(FeedSource.url.in_(RSS_FEEDS)))).scalars().all())
+    missing = [url for url in RSS_FEEDS if url not in existing]
+    db.add_all([FeedSource(url=url, team_id=None) for url in missing])
+    seeded += len(missing)
+
+    if seeded:
+        await db.commit()
+    return seeded
@@ -0,0 +1,198 @@
+# app/services/generation_planner.py
+#
+# Coda di priorità del job di generazione articoli. Ogni team con feed nuovi riceve un
+# punteggio che combina volume di feed, peso della notizia principale (quanti feed
+# raccontano la stessa storia) e visite alla pagina. I team rimasti fuori dal budget di
+# un run accumulano skipped_runs e salgono in classifica ai run successivi (aging).
+
+import logging
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import PAGE_VIEWS_DECAY, SKIPPED_RUN_AGING
+from app.db import async_session
+from app.models.article import Article
+from app.models.feed import Feed
+from app.models.team import Team
+from app.models.team_schedule import TeamScheduleState
+
+logger = logging.getLogger("generation_planner")
+
+STORY_WINDOW = 40             # feed più recenti considerati per il peso della notizia
+STORY_SIMILARITY = 0.4        # Jaccard minimo tra titoli della stessa storia
+NEW_ARTICLE_BOOST = 2.0       # un team senza articolo ha la pagina vuota
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class PageViewCounter:
+    """Conta in memoria le visite alle pagine dei team; il flush somma i conteggi su DB."""
+
+    def __init__(self):
+        self._pending: Dict[int, int] = defaultdict(int)
+
+    def hit(self, team_id: Optional[int]) -> None:
+        if team_id is not None:
+            self._pending[team_id] += 1
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = dict(self._pending), defaultdict(int)
+        try:
+            async with async_session() as db:
+                for team_id, views in batch.items():
+                    # Incremento atomico: più worker possono scrivere sulla stessa riga
+                    result = await db.execute(
+                        update(TeamScheduleState)
+                        .where(TeamScheduleState.team_id == team_id)
+                        .values(page_views=TeamScheduleState.page_views + views)
+                    )
+                    if result.rowcount == 0:
+                        db.add(TeamScheduleState(team_id=team_id, page_views=views, skipped_runs=0))
+                await db.commit()
+            return len(batch)
+        except Exception as e:
+            logger.error(f"[GenerationPlanner] Errore durante il flush delle visite: {e}")
+            for team_id, views in batch.items():
+                self._pending[team_id] += views
+            return 0
+
+
+page_views = PageViewCounter()
+
+
+@dataclass
+class TeamPlan:
+    team: Team
+    has_article: bool
+    feed_count: int
+    story_weight: int
+    page_views: float
+    skipped_runs: int
+
+    @property
+    def score(self) -> float:
+        volume = math.log1p(self.feed_count)
+        story = math.log1p(self.story_weight - 1)
+        traffic = 1 + math.log1p(self.page_views)
+        aging = 1 + SKIPPED_RUN_AGING * self.skipped_runs
+        boost = 1.0 if self.has_article else NEW_ARTICLE_BOOST
+        return (volume + story) * traffic * aging * boost
+
+
+def _words(title: str) -> frozenset:
+    return frozenset(w for w in _WORD_RE.findall((title or "").lower()) if len(w) > 3)
+
+
+def story_weight(titles: List[str]) -> int:
+    """Dimensione del gruppo più grande di titoli simili: quanti feed parlano della notizia principale."""
+    word_sets = [_words(t) for t in titles[:STORY_WINDOW]]
+    best = 1 if word_sets else 0
+    for i, words in enumerate(word_sets):
+        if not words:
+            continue
+        size = 1 + sum(
+            1 for j, other in enumerate(word_sets)
+            if j != i and other and len(words & other) / len(words | other) >= STORY_SIMILARITY
+        )
+        best = max(best, size)
+    return best
+
+
+async def plan_generation(db: AsyncSession, team_ids: Optional[List[int]] = None) -> List[TeamPlan]:
+    """Team con feed da processare, dal punteggio più alto."""
+    pending = [Feed.processed == False, Feed.team_id != None]
+    teams_stmt = select(Team)
+    if team_ids is not None:
+        teams_stmt = teams_stmt.where(Team.id.in_(team_ids))
+        pending.append(Feed.team_id.in_(team_ids))
+
+    # Il volume si conta su DB; in memoria arrivano solo gli ultimi STORY_WINDOW titoli per team
+    counts_stmt = select(Feed.team_id, func.count()).where(*pending).group_by(Feed.team_id)
+    ranked = (
+        select(
+            Feed.team_id,
+            Feed.title,
+            func.row_number().over(partition_by=Feed.team_id, order_by=Feed.published_at.desc()).label("rn"),
+        )
+        .where(*pending)
+        .subquery()
+    )
+    titles_stmt = (
+        select(ranked.c.team_id, ranked.c.title)
+        .where(ranked.c.rn <= STORY_WINDOW)
+        .order_by(ranked.c.team_id, ranked.c.rn)
+    )
+
+    teams = (await db.execute(teams_stmt)).scalars().all()
+    with_article = set((await db.execute(select(Article.team_id))).scalars().all())
+    states = {s.team_id: s for s in (await db.execute(select(TeamScheduleState))).scalars().all()}
+    feed_counts = dict((await db.execute(counts_stmt)).all())
+
+    titles: Dict[int, List[str]] = defaultdict(list)
+    for team_id, title in (await db.execute(titles_stmt)).all():
+        titles[team_id].append(title)
+
+    plans = []
+    for team in teams:
+        if not feed_counts.get(team.id):
+            continue
+        state = states.get(team.id)
+        plans.append(TeamPlan(
+            team=team,
+            has_article=team.id in with_article,
+            feed_count=feed_counts[team.id],
+            story_weight=story_weight(titles[team.id]),
+            page_views=state.page_views if state else 0.0,
+            skipped_runs=state.skipped_runs if state else 0,
+        ))
+
+    plans.sort(key=lambda p: p.score, reverse=True)
+    return plans
+
+
+async def record_outcome(db: AsyncSession, processed: Iterable[int], skipped: Iterable[int],
+                         team_ids: Optional[List[int]] = None) -> None:
+    """
+    Azzera l'aging dei team processati, lo incrementa per quelli rimandati e fa decadere le visite.
+
+    :param team_ids: team gestiti da questo run (lo shard del worker); None = tutti
+    """
+    processed, skipped = set(processed), set(skipped)
+    now = datetime.now(timezone.utc)
+
+    decay = update(TeamScheduleState).values(page_views=TeamScheduleState.page_views * PAGE_VIEWS_DECAY)
+    if team_ids is not None:
+        decay = decay.where(TeamScheduleState.team_id.in_(team_ids))
+    await db.execute(decay)
+
+    existing = set((await db.execute(
+        select(TeamScheduleState.team_id).where(TeamScheduleState.team_id.in_(processed | skipped))
+    )).scalars().all())
+    db.add_all([
+        TeamScheduleState(team_id=team_id, page_views=0.0, skipped_runs=0)
+        for team_id in (processed | skipped) - existing
+    ])
+    await db.flush()
+
+    if processed:
+        await db.execute(
+            update(TeamScheduleState)
+            .where(TeamScheduleState.team_id.in_(processed))
+            .values(skipped_runs=0, last_processed_at=now)
+        )
+    if skipped:
+        await db.execute(
+            update(TeamScheduleState)
+            .where(TeamScheduleState.team_id.in_(skipped))
+            .values(skipped_runs=TeamScheduleState.skipped_runs + 1)
+        )
+    await db.commit()
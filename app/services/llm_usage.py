@@ -0,0 +1,186 @@
+# app/services/llm_usage.py
+#
+# Ledger dell'utilizzo LLM: ogni chiamata OpenAI viene registrata in memoria
+# e scritta su DB a blocchi, fuori dal percorso critico dei job.
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import LLM_DAILY_TOKEN_BUDGET, LLM_BUDGET_SOFT_RATIO
+from app.db import async_session
+from app.metrics import current_job_run, record_llm_tokens
+from app.models.llm_usage import LLMUsage
+from app.models.team import Team
+
+logger = logging.getLogger("llm_usage")
+
+FLUSH_BATCH_SIZE = 50
+MAX_PENDING_RECORDS = 5000  # con il DB irraggiungibile i record più vecchi oltre questa soglia vengono scartati
+
+# Prezzi in USD per milione di token (input, output)
+MODEL_PRICING = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = MODEL_PRICING.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+@dataclass
+class BudgetStatus:
+    budget: int
+    used: int
+
+    @property
+    def ratio(self) -> float:
+        return self.used / self.budget if self.budget else 0.0
+
+    @property
+    def near_limit(self) -> bool:
+        return bool(self.budget) and self.ratio >= LLM_BUDGET_SOFT_RATIO
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.budget) and self.used >= self.budget
+
+
+class UsageLedger:
+    def __init__(self, batch_size: int = FLUSH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._pending: List[dict] = []
+        self.dropped = 0
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record_response(self, call_site: str, model: str, response, latency: float,
+                        team_id: Optional[int] = None) -> None:
+        """Registra l'usage di una risposta OpenAI. Non tocca il DB: il flush avviene a blocchi."""
+        record_llm_tokens(call_site, response)
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+        self._pending.append({
+            "call_site": call_site,
+            "model": model,
+            "prompt_tokens": (usage.prompt_tokens or 0) if usage else 0,
+            "completion_tokens": (usage.completion_tokens or 0) if usage else 0,
+            "cached_tokens": cached_tokens,
+            "latency_ms": latency * 1000,
+            "cache_hit": cached_tokens > 0,
+            "team_id": team_id,
+            "job_run": current_job_run.get(),
+        })
+        self._trim()
+
+        if len(self._pending) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    def _trim(self) -> None:
+        excess = len(self._pending) - MAX_PENDING_RECORDS
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+            logger.warning(f"[LLMUsage] Coda piena: scartati {excess} record più vecchi ({self.dropped} dall'avvio).")
+
+    def pending_tokens(self) -> int:
+        return sum(r["prompt_tokens"] + r["completion_tokens"] for r in self._pending)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                async with async_session() as db:
+                    await db.execute(insert(LLMUsage), batch)
+                    await db.commit()
+                return len(batch)
+            except Exception as e:
+                logger.error(f"[LLMUsage] Errore durante il flush di {len(batch)} record: {e}")
+                # Rimette in coda i record per il prossimo flush, entro MAX_PENDING_RECORDS
+                self._pending = batch + self._pending
+                self._trim()
+                return 0
+
+    async def budget_status(self, db: AsyncSession) -> BudgetStatus:
+        """Token consumati oggi (ora italiana), inclusi quelli non ancora scritti su DB."""
+        result = await db.execute(
+            select(func.coalesce(func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens), 0))
+            .where(LLMUsage.created_at >= _start_of_day())
+        )
+        used = int(result.scalar_one()) + self.pending_tokens()
+        return BudgetStatus(budget=LLM_DAILY_TOKEN_BUDGET, used=used)
+
+
+usage_ledger = UsageLedger()
+
+
+def _start_of_day() -> datetime:
+    now = datetime.now(ZoneInfo("Europe/Rome"))
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _since(days: int) -> datetime:
+    return _start_of_day() - timedelta(days=max(days, 1) - 1)
+
+
+def _aggregate(rows, key_fields) -> List[dict]:
+    """Somma token, chiamate e costo per chiave (il costo dipende dal modello di ogni riga)."""
+    totals = {}
+    for row in rows:
+        key = tuple(getattr(row, f) for f in key_fields)
+        entry = totals.setdefault(key, {
+            **dict(zip(key_fields, key)),
+            "calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cache_hits": 0,
+            "cost_usd": 0.0,
+        })
+        entry["calls"] += row.calls
+        entry["prompt_tokens"] += row.prompt_tokens
+        entry["completion_tokens"] += row.completion_tokens
+        entry["cache_hits"] += row.cache_hits
+        entry["cost_usd"] += estimate_cost(row.model, row.prompt_tokens, row.completion_tokens)
+
+    return sorted(totals.values(), key=lambda e: e["cost_usd"], reverse=True)
+
+
+def _usage_columns():
+    return (
+        LLMUsage.model,
+        func.count(LLMUsage.id).label("calls"),
+        func.coalesce(func.sum(LLMUsage.prompt_tokens), 0).label("prompt_tokens"),
+        func.coalesce(func.sum(LLMUsage.completion_tokens), 0).label("completion_tokens"),
+        func.count(LLMUsage.id).filter(LLMUsage.cache_hit == True).label("cache_hits"),
+    )
+
+
+async def usage_by_team(db: AsyncSession, days: int = 7) -> List[dict]:
+    result = await db.execute(
+        select(LLMUsage.team_id, Team.name.label("team"), *_usage_columns())
+        .outerjoin(Team, Team.id == LLMUsage.team_id)
+        .where(LLMUsage.created_at >= _since(days))
+        .group_by(LLMUsage.team_id, Team.name, LLMUsage.model)
+    )
+    return _aggregate(result.all(), ("team_id", "team"))
+
+
+async def usage_by_job(db: AsyncSession, days: int = 7) -> List[dict]:
+    result = await db.execute(
+        select(LLMUsage.job_run, LLMUsage.call_site, *_usage_columns())
+        .where(LLMUsage.created_at >= _since(days))
+        .group_by(LLMUsage.job_run, LLMUsage.call_site, LLMUsage.model)
+    )
+    return _aggregate(result.all(), ("job_run", "call_site"))
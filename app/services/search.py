@@ -0,0 +1,100 @@
+# app/services/search.py
+#
+# Ricerca full-text su feed e articoli tramite un indice GIN su espressione
+# (vedi app/schema_upgrades.py, search_vector_sql). Ranking, paginazione keyset e snippet
+# sono calcolati interamente su PostgreSQL: in Python arrivano solo i campi della pagina.
+
+import base64
+import json
+from typing import Optional
+
+from sqlalchemy import select, func, literal_column, or_, and_
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.article import Article
+from app.models.feed import Feed
+from app.models.team import Team
+from app.schema_upgrades import search_vector_sql
+
+MAX_LIMIT = 50
+HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=30, MinWords=10, StartSel=<mark>, StopSel=</mark>"
+
+SEARCH_TARGETS = {
+    "feeds": (Feed.__table__, ("link", "published_at")),
+    "articles": (Article.__table__, ("last_updated",)),
+}
+
+
+class SearchUnavailable(Exception):
+    """La ricerca full-text richiede PostgreSQL."""
+
+
+def encode_cursor(rank: float, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    rank, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(rank), int(row_id)
+
+
+async def search(db: AsyncSession, q: str, kind: str = "feeds", limit: int = 20,
+                 cursor: Optional[str] = None) -> dict:
+    if db.bind.dialect.name != "postgresql":
+        raise SearchUnavailable()
+
+    table, extra_columns = SEARCH_TARGETS[kind]
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    # Stessa espressione dell'indice, altrimenti il planner non lo usa
+    vector = literal_column(search_vector_sql(table.name, qualify=True), type_=TSVECTOR)
+    query = func.websearch_to_tsquery("italian", q)
+    rank = func.ts_rank_cd(vector, query).label("rank")
+
+    # 1) Pagina di id ordinata per (rank, id) decrescenti, via indice GIN
+    page = (
+        select(table.c.id, rank)
+        .where(vector.bool_op("@@")(query))
+        .order_by(rank.desc(), table.c.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor)
+        rank_expr = func.ts_rank_cd(vector, query)
+        page = page.where(or_(
+            rank_expr < last_rank,
+            and_(rank_expr == last_rank, table.c.id < last_id),
+        ))
+    page = page.subquery("page")
+
+    # 2) Snippet solo per le righe della pagina: il testo completo non lascia il DB
+    snippet = func.ts_headline(
+        "italian",
+        func.coalesce(func.nullif(table.c.content, ""), table.c.summary, ""),
+        query,
+        HEADLINE_OPTIONS,
+    ).label("snippet")
+    stmt = (
+        select(
+            page.c.id,
+            page.c.rank,
+            table.c.title,
+            table.c.team_id,
+            Team.name.label("team"),
+            *[table.c[name] for name in extra_columns],
+            snippet,
+        )
+        .join(table, table.c.id == page.c.id)
+        .outerjoin(Team, Team.id == table.c.team_id)
+        .order_by(page.c.rank.desc(), page.c.id.desc())
+    )
+    rows = (await db.execute(stmt)).mappings().all()
+
+    results = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = encode_cursor(last["rank"], last["id"])
+
+    return {"query": q, "kind": kind, "results": results, "next_cursor": next_cursor}
@@ -0,0 +1,242 @@
+# app/services/static_publisher.py
+#
+# Snapshot statico delle pagine pubbliche. A fine generazione index.html e le pagine
+# dei team vengono renderizzate con gli stessi template Jinja in PUBLISH_DIR, con una
+# variante .gz precompressa. Si riscrivono solo le pagine dei team il cui articolo è
+# cambiato rispetto al manifest dell'ultimo snapshot. Ogni file viene sostituito in modo
+# atomico (file temporaneo + os.replace): chi legge vede sempre la versione vecchia o la nuova.
+#
+# Con SERVE_MODE=static il middleware in app/main.py serve questi file senza toccare il DB;
+# in modalità dinamica vengono usati come riserva quando il DB non risponde.
+
+import asyncio
+import email.utils
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app.config import PUBLISH_DIR, STATIC_URL
+from app.models.article import Article
+from app.services.generation_planner import page_views
+
+logger = logging.getLogger("static_publisher")
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+MANIFEST = "manifest.json"
+CACHE_CONTROL = "public, max-age=60"
+PUBLISHED_FILE_MODE = 0o644
+
+_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(["html"]))
+
+
+def _team_slug(name: str) -> str:
+    return name.lower()
+
+
+def _team_page(root: Path, slug: str) -> Path:
+    return root / "team" / f"{slug}.html"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        # mkstemp crea file 0600 e os.replace conserva i permessi: le pagine devono essere leggibili
+        # anche da altri utenti (nginx, sync verso CDN) quando PUBLISH_DIR è condivisa
+        os.fchmod(fd, PUBLISHED_FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _write_page(path: Path, html: str) -> None:
+    data = html.encode("utf-8")
+    # Prima la variante compressa: quando compare il nuovo .html anche il .gz è già aggiornato
+    _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    _write_atomic(path, data)
+
+
+def _remove_page(path: Path) -> None:
+    for p in (path, path.with_name(path.name + ".gz")):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Confronto debole (RFC 9110 §13.1.2): `*` o uno dei tag della lista, ignorando il prefisso W/."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None or since.tzinfo is None:
+        return False
+    # Last-Modified ha la risoluzione del secondo
+    return int(mtime) <= since.timestamp()
+
+
+def _read_manifest(root: Path) -> Dict:
+    try:
+        return json.loads((root / MANIFEST).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {"teams": {}}
+
+
+def _snapshot(article: Article) -> SimpleNamespace:
+    # Copia dei soli campi usati dai template: il rendering avviene fuori dalla sessione
+    team = SimpleNamespace(id=article.team.id, name=article.team.name, logo_url=article.team.logo_url)
+    return SimpleNamespace(
+        team_id=article.team_id,
+        title=article.title,
+        content=article.content,
+        sources=article.sources,
+        last_updated=article.last_updated,
+        team=team,
+    )
+
+
+def _render(root: Path, articles: List[SimpleNamespace]) -> int:
+    manifest = _read_manifest(root)
+    published = manifest.get("teams", {})
+    current = {
+        _team_slug(a.team.name): {"team_id": a.team_id, "version": a.last_updated.isoformat() if a.last_updated else ""}
+        for a in articles
+    }
+
+    changed = [
+        a for a in articles
+        if published.get(_team_slug(a.team.name)) != current[_team_slug(a.team.name)]
+        or not _team_page(root, _team_slug(a.team.name)).exists()
+    ]
+    removed = set(published) - set(current)
+
+    if not changed and not removed and (root / "index.html").exists():
+        return 0
+
+    article_template = _env.get_template("article.html")
+    for article in changed:
+        html = article_template.render(article=article, STATIC_URL=STATIC_URL)
+        _write_page(_team_page(root, _team_slug(article.team.name)), html)
+    for slug in removed:
+        _remove_page(_team_page(root, slug))
+
+    html = _env.get_template("index.html").render(articles=articles, STATIC_URL=STATIC_URL)
+    _write_page(root / "index.html", html)
+
+    # Il manifest per ultimo: se il publish si interrompe, al run successivo si riparte dalle pagine mancanti
+    _write_atomic(root / MANIFEST, json.dumps({"teams": current}).encode("utf-8"))
+    return len(changed)
+
+
+async def publish_snapshot(db: AsyncSession, publish_dir: str = PUBLISH_DIR) -> int:
+    """
+    Aggiorna lo snapshot statico. Rendering e scrittura avvengono in un thread per non bloccare il loop.
+
+    :return: numero di pagine team riscritte
+    """
+    result = await db.execute(
+        select(Article)
+        .join(Article.team)
+        .options(joinedload(Article.team))
+        .order_by(Article.team_id)
+    )
+    articles = [_snapshot(a) for a in result.scalars().all()]
+
+    start = time.perf_counter()
+    written = await asyncio.to_thread(_render, Path(publish_dir), articles)
+    if written:
+        logger.info(f"[StaticPublisher] {written} pagine team aggiornate in {time.perf_counter() - start:.2f}s.")
+    return written
+
+
+class SnapshotServer:
+    """Risolve i path pubblici sui file dello snapshot e li serve, precompressi se il client accetta gzip."""
+
+    def __init__(self, publish_dir: str = PUBLISH_DIR):
+        self.root = Path(publish_dir)
+        self._team_ids: Dict[str, int] = {}
+        self._manifest_mtime = None
+
+    def _page_for(self, path: str) -> Optional[Path]:
+        if path == "/":
+            return self.root / "index.html"
+        if path.startswith("/team/"):
+            slug = _team_slug(path[len("/team/"):].strip("/"))
+            if slug and "/" not in slug and not slug.startswith("."):
+                return _team_page(self.root, slug)
+        return None
+
+    def _team_id(self, slug: str) -> Optional[int]:
+        try:
+            mtime = (self.root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            teams = _read_manifest(self.root).get("teams", {})
+            self._team_ids = {s: entry["team_id"] for s, entry in teams.items()}
+            self._manifest_mtime = mtime
+        return self._team_ids.get(slug)
+
+    def response(self, request: Request) -> Optional[Response]:
+        if request.method not in ("GET", "HEAD"):
+            return None
+        page = self._page_for(request.url.path)
+        if page is None:
+            return None
+
+        headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        path = page
+        gz = page.with_name(page.name + ".gz")
+        if "gzip" in request.headers.get("accept-encoding", "") and gz.exists():
+            path = gz
+            headers["Content-Encoding"] = "gzip"
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        # If-Modified-Since vale solo in assenza di If-None-Match
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            not_modified = _not_modified_since(request.headers.get("if-modified-since", ""), stat.st_mtime)
+        if not_modified:
+            return Response(status_code=304, headers={**headers, "ETag": etag, "Last-Modified": last_modified})
+
+        if page.parent.name == "team":
+            page_views.hit(self._team_id(page.stem))
+
+        return FileResponse(path, media_type="text/html; charset=utf-8", stat_result=stat,
+                            headers={**headers, "ETag": etag, "Last-Modified": last_modified})
+
+
+snapshot_server = SnapshotServer()
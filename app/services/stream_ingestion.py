@@ -0,0 +1,134 @@
+# app/services/stream_ingestion.py
+#
+# Ingestion delle sorgenti generaliste multi-team (feeds.json): feed grandi, ordinati
+# dal più recente, che coprono tutte le squadre. Il corpo della risposta viene parsato
+# in streaming con lxml e la lettura si interrompe (chiudendo anche il download) appena
+# si incontra l'ultima entry vista al run precedente. Le entry nuove vengono messe in
+# coda con team_id=None per il job di associazione.
+
+import datetime
+import logging
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+import httpx
+from lxml import etree
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.feed import Feed
+from app.models.feed_source import FeedSource
+from app.metrics import FEEDS_TOTAL
+
+logger = logging.getLogger("stream_ingestion")
+logger.setLevel(logging.INFO)
+
+MAX_LEN = 1024
+MAX_NEW_ENTRIES = 500  # tetto per run, es. primo avvio su un feed con migliaia di entry
+REQUEST_TIMEOUT = 20
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+CONTENT_ENCODED = "{http://purl.org/rss/1.0/modules/content/}encoded"
+ENTRY_TAGS = ("item", f"{ATOM}entry")
+
+
+def _text(elem, *tags) -> str:
+    for tag in tags:
+        child = elem.find(tag)
+        if child is not None and child.text:
+            return child.text.strip()
+    return ""
+
+
+def _link(elem) -> str:
+    link = _text(elem, "link")
+    if link:
+        return link
+    atom_link = elem.find(f"{ATOM}link")
+    return atom_link.get("href", "") if atom_link is not None else ""
+
+
+def _published_at(elem) -> datetime.datetime:
+    raw = _text(elem, "pubDate", f"{ATOM}published", f"{ATOM}updated")
+    try:
+        if raw[:4].isdigit():
+            return datetime.datetime.fromisoformat(raw)
+        return parsedate_to_datetime(raw)
+    except Exception:
+        return datetime.datetime.utcnow()
+
+
+def _parse_entry(elem, source_url: str) -> Optional[dict]:
+    entry_id = (_text(elem, "guid", f"{ATOM}id") or _link(elem))[:MAX_LEN]
+    if not entry_id:
+        return None
+    return {
+        "feed_source": source_url[:MAX_LEN],
+        "feed_entry_id": entry_id,
+        "title": _text(elem, "title", f"{ATOM}title")[:MAX_LEN],
+        "link": _link(elem)[:MAX_LEN],
+        "summary": _text(elem, "description", f"{ATOM}summary")[:MAX_LEN],
+        "content": _text(elem, CONTENT_ENCODED, f"{ATOM}content"),
+        "published_at": _published_at(elem),
+    }
+
+
+async def read_new_entries(source_url: str, last_entry_id: Optional[str],
+                           client: httpx.AsyncClient) -> List[dict]:
+    """
+    Legge il feed a blocchi e restituisce le entry più recenti di `last_entry_id`, dalla più nuova.
+    Memoria limitata alle entry nuove: ogni elemento viene liberato subito dopo il parsing.
+    """
+    parser = etree.XMLPullParser(events=("end",), tag=ENTRY_TAGS, resolve_entities=False, no_network=True)
+    entries: List[dict] = []
+
+    async with client.stream("GET", source_url, timeout=REQUEST_TIMEOUT, follow_redirects=True) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                entry = _parse_entry(elem, source_url)
+
+                # Libera l'elemento e i fratelli già letti
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+                if entry is None:
+                    continue
+                if entry["feed_entry_id"] == last_entry_id or len(entries) >= MAX_NEW_ENTRIES:
+                    # Uscire dal blocco chiude la risposta: il resto del feed non viene scaricato
+                    return entries
+                entries.append(entry)
+
+    return entries
+
+
+async def ingest_stream_source(db: AsyncSession, source: FeedSource, client: httpx.AsyncClient) -> int:
+    """
+    Aggiunge alla sessione i feed nuovi di una sorgente multi-team e aggiorna il suo cursore.
+    Il commit resta a carico del chiamante, così feed e cursore vengono salvati insieme.
+
+    :return: numero di feed nuovi
+    """
+    entries = await read_new_entries(source.url, source.last_entry_id, client)
+    if not entries:
+        logger.info(f"[StreamIngestion] {source.url}: nessuna entry nuova.")
+        return 0
+
+    # Deduplica in blocco: la stessa notizia può essere già arrivata da un'altra sorgente
+    entry_ids = [e["feed_entry_id"] for e in entries]
+    result = await db.execute(select(Feed.feed_entry_id).where(Feed.feed_entry_id.in_(entry_ids)))
+    existing = set(result.scalars().all())
+
+    new_entries = {e["feed_entry_id"]: e for e in entries if e["feed_entry_id"] not in existing}
+    db.add_all([Feed(**entry, processed=False, team_id=None) for entry in new_entries.values()])
+    FEEDS_TOTAL.labels("skipped").inc(len(entries) - len(new_entries))
+
+    await db.execute(
+        update(FeedSource)
+        .where(FeedSource.id == source.id)
+        .values(last_entry_id=entries[0]["feed_entry_id"])
+    )
+    logger.info(f"[StreamIngestion] {source.url}: {len(new_entries)} entry nuove da associare.")
+    return len(new_entries)
@@ -0,0 +1,275 @@
+# app/services/structured_llm.py
+#
+# Chiamate OpenAI con output strutturato (response_format json_schema, strict) e risposta
+# in streaming. Il testo in arrivo viene validato a ogni chunk: se esce dallo schema
+# (valore fuori enum, chiave sconosciuta) o supera i limiti di lunghezza lo stream viene
+# chiuso subito, senza pagare il resto della generazione, e la chiamata viene ripetuta una
+# volta con un budget di token ridotto. Al chiamante arriva solo un oggetto già validato.
+
+import json
+import logging
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+from app.metrics import LLM_ERRORS, time_llm_call
+from app.services.llm_usage import usage_ledger
+
+logger = logging.getLogger("structured_llm")
+
+RETRY_TOKEN_RATIO = 0.6  # budget del secondo tentativo rispetto al primo
+
+
+class StructuredOutputError(Exception):
+    """Risposta fuori schema, troncata o oltre i limiti di lunghezza."""
+
+
+@dataclass
+class StringField:
+    min_length: int = 0
+    max_length: Optional[int] = None
+    enum: Optional[Sequence[str]] = None
+
+    def json_schema(self) -> dict:
+        # I limiti di lunghezza restano lato client: lo schema strict li accetta solo su alcuni modelli
+        schema = {"type": "string"}
+        if self.enum is not None:
+            schema["enum"] = list(self.enum)
+        return schema
+
+
+@dataclass
+class ObjectSpec:
+    """Oggetto JSON piatto di sole stringhe, tutte obbligatorie (requisito della modalità strict)."""
+    name: str
+    fields: Dict[str, StringField] = field(default_factory=dict)
+
+    def json_schema(self) -> dict:
+        return {
+            "type": "object",
+            "properties": {key: f.json_schema() for key, f in self.fields.items()},
+            "required": list(self.fields),
+            "additionalProperties": False,
+        }
+
+    def response_format(self) -> dict:
+        return {"type": "json_schema", "json_schema": {"name": self.name, "strict": True, "schema": self.json_schema()}}
+
+    def check_partial(self, key: str, value: str, complete: bool) -> None:
+        spec = self.fields.get(key)
+        if spec is None:
+            raise StructuredOutputError(f"chiave inattesa '{key}'")
+        if spec.max_length is not None and len(value) > spec.max_length:
+            raise StructuredOutputError(f"'{key}' oltre {spec.max_length} caratteri")
+        if spec.enum is not None:
+            if complete and value not in spec.enum:
+                raise StructuredOutputError(f"'{key}' fuori enum: {value!r}")
+            if not any(option.startswith(value) for option in spec.enum):
+                raise StructuredOutputError(f"'{key}' fuori enum: {value!r}...")
+
+    def validate(self, data) -> dict:
+        if not isinstance(data, dict):
+            raise StructuredOutputError("la risposta non è un oggetto JSON")
+        for key, spec in self.fields.items():
+            value = data.get(key)
+            if not isinstance(value, str):
+                raise StructuredOutputError(f"'{key}' mancante o non stringa")
+            self.check_partial(key, value, complete=True)
+            if len(value.strip()) < spec.min_length:
+                raise StructuredOutputError(f"'{key}' più corto di {spec.min_length} caratteri")
+        return data
+
+
+class PartialObjectParser:
+    """
+    Parser incrementale di un oggetto JSON piatto {"chiave": "stringa", ...}.
+    Ogni carattere viene letto una sola volta; dopo ogni chunk i valori parziali vengono
+    controllati contro lo spec.
+    """
+
+    def __init__(self, spec: ObjectSpec):
+        self.spec = spec
+        self.state = "start"
+        self._key: List[str] = []
+        self._value: List[str] = []
+        self._current_key: Optional[str] = None
+        self._string_target = None
+        self._unicode: List[str] = []
+
+    def feed(self, text: str) -> None:
+        for ch in text:
+            self._step(ch)
+        if self.state in ("value", "escape", "unicode") and self._string_target is self._value:
+            spec = self.spec.fields[self._current_key]
+            if spec.enum is None:
+                # Solo la lunghezza: evita di ricomporre il valore a ogni chunk
+                if spec.max_length is not None and len(self._value) > spec.max_length:
+                    raise StructuredOutputError(f"'{self._current_key}' oltre {spec.max_length} caratteri")
+            else:
+                self.spec.check_partial(self._current_key, "".join(self._value), complete=False)
+
+    def _step(self, ch: str) -> None:
+        state = self.state
+        if state in ("escape", "unicode"):
+            return self._escape(ch)
+        if state in ("key", "value"):
+            if ch == "\\":
+                self.state = "escape"
+            elif ch == '"':
+                self._end_string()
+            else:
+                self._string_target.append(ch)
+            return
+        if ch.isspace():
+            return
+        if state == "start":
+            if ch != "{":
+                raise StructuredOutputError("la risposta non inizia con un oggetto JSON")
+            self.state = "key_or_end"
+        elif state in ("key_or_end", "key_start") and ch == '"':
+            self._key = []
+            self._string_target = self._key
+            self.state = "key"
+        elif state == "key_or_end" and ch == "}":
+            self.state = "done"
+        elif state == "colon" and ch == ":":
+            self.state = "value_start"
+        elif state == "value_start" and ch == '"':
+            self._value = []
+            self._string_target = self._value
+            self.state = "value"
+        elif state == "after_value" and ch == ",":
+            self.state = "key_start"
+        elif state == "after_value" and ch == "}":
+            self.state = "done"
+        else:
+            raise StructuredOutputError(f"carattere inatteso {ch!r} ({state})")
+
+    def _escape(self, ch: str) -> None:
+        if self.state == "unicode":
+            self._unicode.append(ch)
+            if len(self._unicode) == 4:
+                try:
+                    code = int("".join(self._unicode), 16)
+                except ValueError:
+                    raise StructuredOutputError("escape unicode non valido")
+                target = self._string_target
+                # Coppia surrogata (\ud83d\udd25): un solo carattere, come in json.loads
+                if 0xDC00 <= code <= 0xDFFF and target and 0xD800 <= ord(target[-1]) <= 0xDBFF:
+                    code = 0x10000 + ((ord(target.pop()) - 0xD800) << 10) + (code - 0xDC00)
+                target.append(chr(code))
+                self.state = "key" if self._string_target is self._key else "value"
+            return
+        if ch == "u":
+            self._unicode = []
+            self.state = "unicode"
+            return
+        self._string_target.append({"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(ch, ch))
+        self.state = "key" if self._string_target is self._key else "value"
+
+    def _end_string(self) -> None:
+        if self._string_target is self._key:
+            self._current_key = "".join(self._key)
+            if self._current_key not in self.spec.fields:
+                raise StructuredOutputError(f"chiave inattesa '{self._current_key}'")
+            self.state = "colon"
+        else:
+            self.spec.check_partial(self._current_key, "".join(self._value), complete=True)
+            self.state = "after_value"
+
+
+@dataclass
+class StructuredResult:
+    data: dict
+    tokens: int
+
+
+async def _stream_attempt(client, call_site: str, model: str, messages: List[dict], spec: ObjectSpec,
+                          max_tokens: int, temperature: float, team_id: Optional[int]) -> StructuredResult:
+    parser = PartialObjectParser(spec)
+    parts: List[str] = []
+    usage = None
+    finish_reason = None
+    error: Optional[StructuredOutputError] = None
+
+    with time_llm_call(call_site, model) as timer:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=spec.response_format(),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        # Uscire dal blocco chiude la connessione: i token non ancora generati non vengono prodotti
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                delta = choice.delta.content if choice.delta else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                try:
+                    parser.feed(delta)
+                except StructuredOutputError as e:
+                    error = e
+                    break
+
+    text = "".join(parts)
+    if usage is None:
+        # Stream interrotto prima del chunk finale: stima grossolana (~4 caratteri per token)
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(text) // 4,
+                                prompt_tokens_details=None)
+    usage_ledger.record_response(call_site, model, SimpleNamespace(usage=usage), timer.elapsed, team_id=team_id)
+    tokens = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+    if error is None and finish_reason == "length":
+        error = StructuredOutputError(f"risposta troncata a {max_tokens} token")
+    if error is None:
+        try:
+            return StructuredResult(data=spec.validate(json.loads(text)), tokens=tokens)
+        except json.JSONDecodeError as e:
+            error = StructuredOutputError(f"JSON non valido: {e}")
+        except StructuredOutputError as e:
+            error = e
+    error.tokens = tokens
+    LLM_ERRORS.labels(call_site, "validation").inc()
+    raise error
+
+
+async def structured_completion(client, call_site: str, model: str, prompt: str, spec: ObjectSpec,
+                                max_tokens: int, temperature: float = 0.0,
+                                team_id: Optional[int] = None) -> StructuredResult:
+    """
+    Esegue la chiamata con al massimo un nuovo tentativo a budget ridotto.
+    Solleva StructuredOutputError se anche il secondo tentativo non produce un oggetto valido;
+    gli errori di rete/API vengono propagati al chiamante.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    try:
+        return await _stream_attempt(client, call_site, model, messages, spec, max_tokens, temperature, team_id)
+    except StructuredOutputError as e:
+        spent = getattr(e, "tokens", 0)
+        logger.warning(f"[{call_site}] Risposta scartata ({e}), nuovo tentativo con budget ridotto.")
+
+    retry_tokens = max(int(max_tokens * RETRY_TOKEN_RATIO), 1)
+    limits = ", ".join(f"{key} al massimo {f.max_length} caratteri" for key, f in spec.fields.items() if f.max_length)
+    messages = messages + [{
+        "role": "user",
+        "content": "La risposta precedente non era valida. Rispetta esattamente lo schema"
+                   + (f" ({limits})" if limits else "") + " e sii più conciso.",
+    }]
+    try:
+        result = await _stream_attempt(client, call_site, model, messages, spec, retry_tokens, temperature, team_id)
+    except StructuredOutputError as e:
+        e.tokens = getattr(e, "tokens", 0) + spent
+        raise
+    result.tokens += spent
+    return result
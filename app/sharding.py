@@ -0,0 +1,102 @@
+# app/sharding.py
+#
+# Ripartizione del lavoro tra più processi worker. Ogni worker registra un heartbeat
+# nella tabella worker_heartbeats; i worker vivi si spartiscono team e sorgenti con
+# rendezvous hashing (HRW): quando un worker entra o esce si sposta solo ~1/N delle chiavi
+# e il ribilanciamento avviene da sé al run successivo di ogni job.
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import WORKER_SHARDING, WORKER_ID, WORKER_HEARTBEAT_TTL_SECONDS
+from app.models.worker import WorkerHeartbeat
+
+logger = logging.getLogger("sharding")
+
+
+def _score(worker_id: str, key: str) -> int:
+    digest = hashlib.blake2b(f"{worker_id}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def rendezvous_owner(key: str, workers: List[str]) -> str:
+    return max(workers, key=lambda worker_id: _score(worker_id, key))
+
+
+@dataclass(frozen=True)
+class Shard:
+    worker_id: str
+    workers: tuple
+
+    @property
+    def count(self) -> int:
+        return len(self.workers)
+
+    @property
+    def index(self) -> int:
+        return self.workers.index(self.worker_id)
+
+    def owns(self, key: str) -> bool:
+        return self.count == 1 or rendezvous_owner(key, list(self.workers)) == self.worker_id
+
+    def owns_team(self, team_id: int) -> bool:
+        return self.owns(f"team:{team_id}")
+
+    def team_ids(self, all_team_ids: Iterable[int]) -> List[int]:
+        return [team_id for team_id in all_team_ids if self.owns_team(team_id)]
+
+    def owns_source(self, source) -> bool:
+        # Le sorgenti di un team seguono il team, quelle multi-team si ripartiscono per id
+        if source.team_id is not None:
+            return self.owns_team(source.team_id)
+        return self.owns(f"source:{source.id}")
+
+
+SINGLE_WORKER = Shard(worker_id=WORKER_ID, workers=(WORKER_ID,))
+
+
+async def heartbeat(db: AsyncSession, worker_id: str = WORKER_ID) -> None:
+    now = datetime.now(timezone.utc)
+    worker = await db.get(WorkerHeartbeat, worker_id)
+    if worker is None:
+        db.add(WorkerHeartbeat(worker_id=worker_id, last_seen=now))
+    else:
+        worker.last_seen = now
+    await db.commit()
+
+
+async def deregister(db: AsyncSession, worker_id: str = WORKER_ID) -> None:
+    """Rimuove subito il worker: gli altri si ridistribuiscono le sue chiavi senza attendere il TTL."""
+    await db.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == worker_id))
+    await db.commit()
+
+
+async def live_workers(db: AsyncSession) -> List[str]:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=WORKER_HEARTBEAT_TTL_SECONDS)
+    result = await db.execute(
+        select(WorkerHeartbeat.worker_id).where(WorkerHeartbeat.last_seen >= cutoff)
+    )
+    return list(result.scalars().all())
+
+
+async def current_shard(db: AsyncSession) -> Shard:
+    """Shard di questo worker in base ai worker vivi in questo momento."""
+    if not WORKER_SHARDING:
+        return SINGLE_WORKER
+
+    try:
+        workers = set(await live_workers(db))
+    except Exception as e:
+        logger.error(f"[Sharding] Impossibile leggere i worker attivi, procedo come worker unico: {e}")
+        return SINGLE_WORKER
+
+    workers.add(WORKER_ID)
+    shard = Shard(worker_id=WORKER_ID, workers=tuple(sorted(workers)))
+    logger.info(f"[Sharding] Worker {WORKER_ID}: shard {shard.index + 1}/{shard.count}")
+    return shard
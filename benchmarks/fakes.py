@@ -0,0 +1,270 @@
+# benchmarks/fakes.py
+#
+# Stand-in locali per i servizi esterni della pipeline: feed RSS stile Google News,
+# sito editore con redirect e pagine articolo, endpoint compatibile OpenAI.
+# Ogni server gira in un thread con ThreadingHTTPServer, senza dipendenze extra.
+
+import json
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+PUBLISHERS = ["Calciomercato.com", "Tuttomercatoweb", "Gazzetta", "Sky Sport", "Corriere dello Sport"]
+PLAYERS = ["Osimhen", "Lukaku", "Dybala", "Zirkzee", "Koopmeiners", "Kvaratskhelia", "Frattesi", "Chiesa"]
+VERBS = ["vicino a", "in trattativa con", "piace a", "nel mirino di", "offerto a"]
+
+LOREM = (
+    "La dirigenza ha avviato i contatti con l'entourage del giocatore e le parti restano in attesa "
+    "di un rilancio che potrebbe arrivare già nei prossimi giorni, con la formula del prestito con "
+    "obbligo di riscatto legata al raggiungimento di determinati obiettivi stagionali."
+)
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class FakeServer:
+    """Avvia un handler su 127.0.0.1 con porta libera; `config` è condiviso con l'handler."""
+
+    def __init__(self, handler_cls, **config):
+        handler = type(handler_cls.__name__, (handler_cls,), {"config": config})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ===============================
+# Feed RSS stile Google News
+# ===============================
+
+class RSSHandler(_QuietHandler):
+    """GET /rss/<key>?n=<entries>&run=<run_id> → feed RSS con n entry che puntano al publisher."""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        match = re.fullmatch(r"/rss/([\w-]+)", parsed.path)
+        if not match:
+            return self._send(404, b"not found", "text/plain")
+
+        params = parse_qs(parsed.query)
+        key = match.group(1)
+        n = int(params.get("n", ["10"])[0])
+        run = params.get("run", ["0"])[0]
+        rng = random.Random(f"{run}-{key}")
+        publisher_url = self.config["publisher_url"]
+
+        items = []
+        for i in range(n):
+            entry_id = f"{run}-{key}-{i}"
+            source = rng.choice(PUBLISHERS)
+            title = f"{rng.choice(PLAYERS)} {rng.choice(VERBS)} {key.capitalize()}: le ultime - {source}"
+            link = f"{publisher_url}/r/{entry_id}"
+            description = f'<a href="{link}" target="_blank">{title}</a>'
+            items.append(
+                "<item>"
+                f"<title>{escape(title)}</title>"
+                f"<link>{escape(link)}</link>"
+                f'<guid isPermaLink="false">CBMi{entry_id}</guid>'
+                f"<pubDate>{formatdate(time.time() - i * 60, usegmt=True)}</pubDate>"
+                f"<description>{escape(description)}</description>"
+                f'<source url="{publisher_url}">{escape(source)}</source>'
+                "</item>"
+            )
+
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+            f"<title>{escape(key)} calciomercato - Google News</title>"
+            "<link>https://news.google.com</link><language>it</language>"
+            + "".join(items)
+            + "</channel></rss>"
+        ).encode("utf-8")
+        self._send(200, body, "application/rss+xml; charset=utf-8")
+
+
+# ===============================
+# Sito editore
+# ===============================
+
+class PublisherHandler(_QuietHandler):
+    """/r/<id> redirige (come i link Google News) a /articles/<id>, che restituisce HTML realistico."""
+
+    def _route(self):
+        path = urlparse(self.path).path
+        if path.startswith("/r/"):
+            entry_id = path[len("/r/"):]
+            return self._send(302, b"", "text/html", {"Location": f"/articles/{entry_id}"})
+        if path.startswith("/articles/"):
+            entry_id = path[len("/articles/"):]
+            return self._send(200, self._article_html(entry_id), "text/html; charset=utf-8")
+        return self._send(404, b"not found", "text/plain")
+
+    do_GET = _route
+    do_HEAD = _route
+
+    def _article_html(self, entry_id: str) -> bytes:
+        rng = random.Random(entry_id)
+        paragraphs = "".join(f"<p>{LOREM} ({i})</p>" for i in range(rng.randint(6, 14)))
+        # Boilerplate tipico di un sito editoriale: menu, script, commenti, footer
+        nav = "".join(f'<li><a href="/sezione/{i}">Sezione {i}</a></li>' for i in range(60))
+        scripts = "<script>var dataLayer=[];" + "x();" * 4000 + "</script>"
+        footer = "<footer>" + "<p>Link correlati</p>" * 40 + "</footer>"
+        return (
+            "<!doctype html><html lang='it'><head><meta charset='utf-8'>"
+            f"<title>Calciomercato {escape(entry_id)}</title>{scripts}</head><body>"
+            f"<nav><ul>{nav}</ul></nav><article><h1>Calciomercato {escape(entry_id)}</h1>"
+            f"{paragraphs}</article>{footer}</body></html>"
+        ).encode("utf-8")
+
+
+# ===============================
+# Endpoint compatibile OpenAI
+# ===============================
+
+class OpenAIHandler(_QuietHandler):
+    """
+    POST /v1/chat/completions con latenza e tasso di 429 configurabili.
+    Supporta response_format json_schema (risponde rispettando lo schema), stream=True
+    (eventi SSE, con il chunk finale di usage se stream_options.include_usage) e max_tokens
+    (contenuto troncato con finish_reason "length").
+    """
+
+    STREAM_CHUNK_CHARS = 16
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/v1/chat/completions":
+            return self._send(404, b"{}", "application/json")
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        stats = self.config["stats"]
+        with stats["lock"]:
+            stats["requests"] += 1
+
+        if random.random() < self.config["rate_429"]:
+            with stats["lock"]:
+                stats["throttled"] += 1
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+            return self._send(429, body, "application/json", {"Retry-After": "0"})
+
+        latency = max(0.0, random.gauss(self.config["latency"], self.config["latency"] / 4))
+
+        prompt = "\n".join(m["content"] for m in request["messages"])
+        content = self._answer(request["messages"][-1]["content"], request.get("response_format"))
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            content, finish_reason = content[:max_tokens * 4], "length"
+
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+        }
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+            return self._stream(request, content, finish_reason, usage if include_usage else None, latency)
+
+        time.sleep(latency)
+        body = json.dumps({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }).encode()
+        self._send(200, body, "application/json")
+
+    def _stream(self, request: dict, content: str, finish_reason: str, usage, latency: float):
+        base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "bench")}
+        pieces = [content[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(content), self.STREAM_CHUNK_CHARS)]
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}]
+        events += [{**base, "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}]} for p in pieces]
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        if usage is not None:
+            events.append({**base, "choices": [], "usage": usage})
+
+        # Metà latenza prima del primo token, il resto distribuito sui chunk
+        time.sleep(latency / 2)
+        per_chunk = latency / 2 / max(len(events), 1)
+
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(per_chunk)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Il client ha interrotto lo stream (validazione anticipata)
+            stats = self.config["stats"]
+            with stats["lock"]:
+                stats["aborted"] += 1
+
+    def _answer(self, prompt: str, response_format=None) -> str:
+        schema = ((response_format or {}).get("json_schema") or {}).get("schema") or {}
+        properties = schema.get("properties", {})
+        if "team" in properties:
+            return json.dumps({"team": random.choice(properties["team"].get("enum") or ["None"])})
+
+        teams = re.search(r"seguenti team: (.+?)\.\n", prompt)
+        if teams and not properties:
+            return random.choice(teams.group(1).split(", ") + ["None"])
+        return json.dumps({
+            "title": "Mercato, le ultime notizie",
+            "content": " ".join([LOREM] * 8),
+        })
+
+
+def start_fakes(openai_latency: float = 0.2, openai_429_rate: float = 0.0):
+    """Avvia i tre stand-in e restituisce (rss, publisher, openai, openai_stats)."""
+    publisher = FakeServer(PublisherHandler).start()
+    rss = FakeServer(RSSHandler, publisher_url=publisher.base_url).start()
+    stats = {"lock": threading.Lock(), "requests": 0, "throttled": 0, "aborted": 0}
+    openai = FakeServer(OpenAIHandler, latency=openai_latency, rate_429=openai_429_rate, stats=stats).start()
+    return rss, publisher, openai, stats
@@ -0,0 +1,207 @@
+# benchmarks/load_test.py
+#
+# Load test del percorso di lettura (read_home, read_article, middleware di redirect,
+# asset statici) eseguito in-process via ASGI contro un database popolato dal seeder.
+#
+#   python -m benchmarks.load_test --teams 20 --requests 2000 --concurrency 50
+#   python -m benchmarks.load_test --database-url postgresql+asyncpg://localhost/bench --no-seed
+#   python -m benchmarks.load_test --serve-mode static
+#
+# Per ogni scenario riporta RPS, latenza p50/p95/p99, query DB per richiesta e quota di 304.
+# Gli scenari *_conditional riusano ETag e Last-Modified ricevuti da una prima richiesta a ogni pagina.
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fakes import LOREM, PLAYERS
+from benchmarks.pipeline import histogram_count
+
+SCENARIOS = ["home", "team", "home_conditional", "team_conditional", "static_css", "static_logo", "root_redirect"]
+LOGOS = ["atalanta", "bologna", "como", "fiorentina", "inter", "juve", "lazio", "milan", "napoli", "roma"]
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def team_name(i: int) -> str:
+    return f"squadra{i:04d}"
+
+
+async def seed(teams: int, article_paragraphs: int):
+    """Crea `teams` squadre, ciascuna con un articolo di dimensione realistica (~paragrafi da 400 caratteri)."""
+    from app.config import STATIC_URL
+    from app.db import async_session, get_engine
+    from app.models.base import Base
+    from app.models.article import Article
+    from app.models.team import Team
+    import app.models  # noqa: F401  registra tutte le tabelle
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(42)
+    async with async_session() as db:
+        for i in range(1, teams + 1):
+            team = Team(id=i, name=team_name(i), logo_url=f"{STATIC_URL}loghi/{LOGOS[i % len(LOGOS)]}.png")
+            paragraphs = [f"{rng.choice(PLAYERS)}: {LOREM}" for _ in range(article_paragraphs)]
+            db.add(team)
+            db.add(Article(
+                team_id=i,
+                title=f"Mercato {team_name(i)}: {rng.choice(PLAYERS)} è il primo obiettivo",
+                content="</p><p>".join(paragraphs),
+                last_updated=datetime.now(timezone.utc),
+            ))
+        await db.commit()
+
+
+async def fetch_validators(client, paths: list) -> dict:
+    """Scarica ogni pagina una volta e ne ricava gli header condizionali (ETag / Last-Modified reali)."""
+    validators = {}
+    for path in paths:
+        response = await client.get(path)
+        headers = {}
+        if "etag" in response.headers:
+            headers["If-None-Match"] = response.headers["etag"]
+        if "last-modified" in response.headers:
+            headers["If-Modified-Since"] = response.headers["last-modified"]
+        validators[path] = headers
+    missing = sum(1 for headers in validators.values() if not headers)
+    if missing:
+        print(f"{missing}/{len(paths)} pagine senza ETag/Last-Modified: le richieste condizionali riceveranno 200")
+    return validators
+
+
+def build_scenarios(teams: int, validators: dict) -> dict:
+    """Ogni scenario è una funzione che restituisce (path, headers) per la prossima richiesta."""
+    rng = random.Random(7)
+
+    def conditional(path: str):
+        return path, validators.get(path, {})
+
+    return {
+        "home": lambda: ("/", {}),
+        "team": lambda: (f"/team/{team_name(rng.randint(1, teams))}", {}),
+        "home_conditional": lambda: conditional("/"),
+        "team_conditional": lambda: conditional(f"/team/{team_name(rng.randint(1, teams))}"),
+        "static_css": lambda: ("/static/styles.css", {}),
+        "static_logo": lambda: (f"/static/loghi/{rng.choice(LOGOS)}.png", {}),
+        "root_redirect": lambda: ("/", {"Host": "top10market.it"}),
+    }
+
+
+async def run_scenario(client, name: str, next_request, total: int, concurrency: int) -> dict:
+    from app.metrics import DB_QUERY_DURATION
+
+    latencies = []
+    statuses = {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            path, headers = next_request()
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    db_before = histogram_count(DB_QUERY_DURATION)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    db_queries = histogram_count(DB_QUERY_DURATION) - db_before
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "db_queries_per_req": round(db_queries / len(latencies), 2) if latencies else 0.0,
+        "not_modified_pct": round(statuses.get(304, 0) * 100 / len(latencies), 1) if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+def print_report(results: list):
+    header = f"{'scenario':<18} {'req':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'db/req':>7} {'304%':>6}  status"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        statuses = ",".join(f"{code}:{n}" for code, n in sorted(r["statuses"].items()))
+        print(
+            f"{r['scenario']:<18} {r['requests']:>6} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['db_queries_per_req']:>7.2f} {r['not_modified_pct']:>6.1f}  {statuses}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test in-process delle pagine del sito")
+    parser.add_argument("--database-url", help="DB da usare (default: SQLite temporaneo). ATTENZIONE: il seeder lo svuota")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--article-paragraphs", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=1000, help="richieste per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", help="sottoinsieme di scenari separati da virgola")
+    parser.add_argument("--no-seed", action="store_true", help="usa i dati già presenti nel DB")
+    parser.add_argument("--serve-mode", choices=("dynamic", "static"), default="dynamic",
+                        help="static: pubblica lo snapshot e serve le pagine dai file")
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmpdir}/load.db"
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+    os.environ["SERVE_MODE"] = args.serve_mode
+    os.environ["PUBLISH_DIR"] = os.path.join(tmpdir, "publish")
+
+    async def run_all():
+        import httpx
+        from app.db import engines
+        from app.main import app
+
+        if not args.no_seed:
+            await seed(args.teams, args.article_paragraphs)
+
+        if args.serve_mode == "static":
+            from app.db import async_session
+            from app.services.static_publisher import publish_snapshot
+            async with async_session() as db:
+                await publish_snapshot(db)
+
+        results = []
+        # Nessun lifespan: lo scheduler non parte, si misura solo il percorso di lettura
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://www.top10market.it") as client:
+            names = args.scenarios.split(",") if args.scenarios else SCENARIOS
+            validators = {}
+            if any(name.endswith("_conditional") for name in names):
+                pages = ["/"] + [f"/team/{team_name(i)}" for i in range(1, args.teams + 1)]
+                validators = await fetch_validators(client, pages)
+            scenarios = build_scenarios(args.teams, validators)
+            selected = [name for name in names if name in scenarios]
+            for name in selected:
+                results.append(await run_scenario(client, name, scenarios[name], args.requests, args.concurrency))
+        for engine in engines.values():
+            await engine.dispose()
+        return results
+
+    print_report(asyncio.run(run_all()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# benchmarks/pipeline.py
+#
+# Benchmark end-to-end della pipeline senza rete: ingestion → association →
+# enrichment → generazione, contro gli stand-in di benchmarks/fakes.py e un
+# database usa-e-getta (SQLite di default, oppure un Postgres indicato con --database-url).
+#
+#   python -m benchmarks.pipeline --sizes 10,100,1000
+#   python -m benchmarks.pipeline --save-baseline
+#
+# Per ogni fase riporta wall time, throughput, round trip DB e chiamate LLM,
+# e segnala le regressioni rispetto a benchmarks/baseline.json.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import start_fakes
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Stesso ordine (e quindi stessi id) del seed di app/scripts/init_db.py
+TEAMS = ["Napoli", "Inter", "Atalanta", "Juventus", "Roma", "Fiorentina", "Lazio", "Bologna", "Milan", "Como"]
+
+
+def histogram_count(histogram) -> float:
+    """Numero totale di osservazioni di un Histogram, sommando tutte le label."""
+    total = 0.0
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count"):
+                total += sample.value
+    return total
+
+
+async def _measure(stage: str, run_stage):
+    """Esegue run_stage() e restituisce wall time, round trip DB e chiamate LLM della fase."""
+    from app.metrics import DB_QUERY_DURATION, LLM_DURATION
+
+    db_before = histogram_count(DB_QUERY_DURATION)
+    llm_before = histogram_count(LLM_DURATION)
+    start = time.perf_counter()
+    feeds = await run_stage()
+    wall = time.perf_counter() - start
+    return {
+        "stage": stage,
+        "feeds": feeds,
+        "wall_s": round(wall, 3),
+        "feeds_per_s": round(feeds / wall, 2) if wall > 0 else 0.0,
+        "db_round_trips": int(histogram_count(DB_QUERY_DURATION) - db_before),
+        "llm_calls": int(histogram_count(LLM_DURATION) - llm_before),
+    }
+
+
+async def _reset_database():
+    from app.db import get_engine
+    from app.models.base import Base
+    import app.models  # noqa: F401  registra tutte le tabelle
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _count_feeds(db, *criteria) -> int:
+    from sqlalchemy import select, func
+    from app.models.feed import Feed
+
+    result = await db.execute(select(func.count(Feed.id)).where(*criteria))
+    return result.scalar_one()
+
+
+async def run_size(size: int, rss_url: str, untagged_ratio: float) -> list:
+    from sqlalchemy import update
+    from app.db import async_session
+    from app.models.feed import Feed
+    from app.models.feed_source import FeedSource
+    from app.models.team import Team
+    from app.services.feed_ingestion import ingest_feeds
+    from app.services.feed_association import FeedTeamAssociatorAI
+    from app.services.article_extractor import FeedContentFetcher
+    from app.services.article_ai import ArticleAIProcessor
+
+    await _reset_database()
+    async with async_session() as db:
+        db.add_all([Team(id=i, name=name, logo_url=None) for i, name in enumerate(TEAMS, start=1)])
+        await db.commit()
+
+    run_id = f"{int(time.time())}-{size}"
+    per_team, extra = divmod(size, len(TEAMS))
+    # Sorgenti puntate al server RSS locale al posto di quelle reali
+    async with async_session() as db:
+        db.add_all([
+            FeedSource(url=f"{rss_url}/rss/{name.lower()}?n={per_team + (1 if i <= extra else 0)}&run={run_id}", team_id=i)
+            for i, name in enumerate(TEAMS, start=1)
+        ])
+        await db.commit()
+
+    results = []
+
+    async def ingest():
+        async with async_session() as db:
+            await ingest_feeds(db)
+            return await _count_feeds(db)
+
+    results.append(await _measure("ingest", ingest))
+
+    # Setup (fuori misura): una quota di feed diventa "senza team" da associare
+    async with async_session() as db:
+        step = max(1, round(1 / untagged_ratio)) if untagged_ratio > 0 else 0
+        if step:
+            await db.execute(update(Feed).where(Feed.id % step == 0).values(team_id=None))
+            await db.commit()
+
+    async def associate():
+        async with async_session() as db:
+            pending = await _count_feeds(db, Feed.team_id == None, Feed.processed == False)
+            await FeedTeamAssociatorAI(db).associate_feeds()
+            return pending
+
+    results.append(await _measure("associate", associate))
+
+    # Setup: rimette in coda i feed associati, così l'enrichment li trova senza contenuto
+    async with async_session() as db:
+        await db.execute(update(Feed).where(Feed.team_id != None).values(processed=False))
+        await db.commit()
+
+    async def enrich():
+        async with async_session() as db:
+            return await FeedContentFetcher(db).enrich_feed_content()
+
+    results.append(await _measure("enrich", enrich))
+
+    # Setup: l'enrichment marca i feed come processed; per misurare la generazione li rimette in coda
+    async with async_session() as db:
+        await db.execute(update(Feed).where(Feed.team_id != None).values(processed=False))
+        await db.commit()
+
+    async def generate():
+        async with async_session() as db:
+            pending = await _count_feeds(db, Feed.team_id != None, Feed.processed == False)
+            await ArticleAIProcessor(db).process_all_teams()
+            return pending
+
+    results.append(await _measure("generate", generate))
+
+    for row in results:
+        row["size"] = size
+    return results
+
+
+def compare_with_baseline(results: list, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    missing = []
+    for row in results:
+        base = baseline.get(f"{row['size']}/{row['stage']}")
+        if not base:
+            missing.append(f"{row['size']}/{row['stage']}")
+            continue
+        for metric in ("wall_s", "db_round_trips", "llm_calls"):
+            if base[metric] and row[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{row['size']}/{row['stage']}: {metric} {row[metric]} vs baseline {base[metric]}"
+                )
+    if missing:
+        print(f"Assenti dal baseline, regressioni non verificate: {', '.join(missing)}")
+    return regressions
+
+
+def print_report(results: list):
+    header = f"{'size':>6} {'stage':<10} {'feeds':>6} {'wall_s':>8} {'feeds/s':>9} {'db_rt':>7} {'llm':>5}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(
+            f"{row['size']:>6} {row['stage']:<10} {row['feeds']:>6} {row['wall_s']:>8.3f} "
+            f"{row['feeds_per_s']:>9.2f} {row['db_round_trips']:>7} {row['llm_calls']:>5}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline della pipeline feed → articoli")
+    parser.add_argument("--sizes", default="10,100,1000", help="numero di feed per run, separati da virgola")
+    parser.add_argument("--database-url", help="DB usa-e-getta (default: SQLite temporaneo). ATTENZIONE: viene svuotato")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="latenza media dell'endpoint OpenAI finto (s)")
+    parser.add_argument("--openai-429-rate", type=float, default=0.0, help="quota di risposte 429")
+    parser.add_argument("--untagged-ratio", type=float, default=0.3, help="quota di feed da associare via LLM")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="regressione tollerata rispetto al baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="salva i risultati come nuovo baseline")
+    parser.add_argument("--json", help="scrive i risultati anche in questo file")
+    args = parser.parse_args(argv)
+
+    rss, publisher, openai, openai_stats = start_fakes(args.openai_latency, args.openai_429_rate)
+
+    # Le variabili vanno impostate prima di importare app.*: config e client OpenAI le leggono all'import
+    tmpdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmpdir}/bench.db"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"{openai.base_url}/v1"
+
+    async def run_all():
+        results = []
+        for size in (int(s) for s in args.sizes.split(",")):
+            results.extend(await run_size(size, rss.base_url, args.untagged_ratio))
+        from app.db import engines
+        for engine in engines.values():
+            await engine.dispose()
+        return results
+
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        for server in (rss, publisher, openai):
+            server.stop()
+
+    print_report(results)
+    print(f"\nOpenAI finto: {openai_stats['requests']} richieste, {openai_stats['throttled']} con 429, "
+          f"{openai_stats['aborted']} stream interrotti")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({f"{r['size']}/{r['stage']}": r for r in results}, f, indent=2)
+        print(f"Baseline salvato in {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print(f"⚠️  Nessun baseline ({BASELINE_PATH}): regressioni NON verificate. "
+              "Usa --save-baseline per crearne uno.")
+        return 0
+
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"⚠️  REGRESSIONE {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+# tests/conftest.py
+#
+# app.config e app.db leggono l'ambiente all'import: valori di prova prima di importare
+# qualsiasi modulo dell'app. Nessun test apre davvero la connessione al DB.
+
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.gettempdir()}/tests.db")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.article_history import (
+    KEYFRAME_INTERVAL,
+    _replay,
+    _serialize,
+    apply_delta,
+    encode_delta,
+    encode_keyframe,
+)
+
+
+@pytest.mark.parametrize("previous, current", [
+    ("", ""),
+    ("", "Nuovo articolo sul derby."),
+    ("Vecchio articolo sul derby.", ""),
+    ("Stesso testo,  con  spazi\nmultipli.\n", "Stesso testo,  con  spazi\nmultipli.\n"),
+    ("La Roma vince il derby.", "Mercato: tre nomi per l'attacco della Lazio!"),
+    ("La Roma vince il derby 2-1.", "La Roma vince il derby 3-1 in rimonta."),
+])
+def test_delta_round_trip(previous, current):
+    assert apply_delta(previous, encode_delta(previous, current)) == current
+
+
+def _chain(documents):
+    rows = []
+    for version, document in enumerate(documents):
+        if version % KEYFRAME_INTERVAL == 0:
+            rows.append(SimpleNamespace(is_keyframe=True, payload=encode_keyframe(document)))
+        else:
+            rows.append(SimpleNamespace(is_keyframe=False, payload=encode_delta(documents[version - 1], document)))
+    return rows
+
+
+def test_replay_across_keyframe_boundary():
+    documents = [
+        _serialize(f"Titolo {v}", f"Aggiornamento numero {v}. " + "Cronaca della partita. " * (v % 5))
+        for v in range(KEYFRAME_INTERVAL + 5)
+    ]
+    rows = _chain(documents)
+    # Ultima versione prima del keyframe, il keyframe stesso e i delta successivi
+    assert _replay(rows[:KEYFRAME_INTERVAL]) == documents[KEYFRAME_INTERVAL - 1]
+    assert _replay(rows[:KEYFRAME_INTERVAL + 1]) == documents[KEYFRAME_INTERVAL]
+    assert _replay(rows) == documents[-1]
+    # Come _load_chain: la catena parte dall'ultimo keyframe <= version
+    assert _replay(rows[KEYFRAME_INTERVAL:]) == documents[-1]
+
+
+def test_replay_without_keyframe():
+    with pytest.raises(ValueError):
+        _replay(_chain(["a", "b"])[1:])
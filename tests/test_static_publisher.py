@@ -0,0 +1,23 @@
+import email.utils
+
+from app.services.static_publisher import _etag_matches, _not_modified_since
+
+ETAG = '"1a2b-3c"'
+
+
+def test_etag_list_and_weak_validators():
+    assert _etag_matches(ETAG, ETAG)
+    assert _etag_matches(f'"other", W/{ETAG}', ETAG)
+    assert _etag_matches("*", ETAG)
+    assert not _etag_matches('"1a2b-3c0"', ETAG)
+    # Niente corrispondenze per sottostringa
+    assert not _etag_matches('"x1a2b-3c"', ETAG)
+    assert not _etag_matches("", ETAG)
+
+
+def test_if_modified_since():
+    mtime = 1_700_000_000.75
+    assert _not_modified_since(email.utils.formatdate(mtime, usegmt=True), mtime)
+    assert not _not_modified_since(email.utils.formatdate(mtime - 60, usegmt=True), mtime)
+    assert not _not_modified_since("non una data", mtime)
+    assert not _not_modified_since("", mtime)
@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.metrics import LLM_ERRORS
+from app.services.structured_llm import (
+    ObjectSpec,
+    PartialObjectParser,
+    StringField,
+    StructuredOutputError,
+    structured_completion,
+)
+
+SPEC = ObjectSpec("article", {
+    "title": StringField(min_length=1, max_length=20),
+    "tone": StringField(enum=("neutro", "entusiasta")),
+})
+
+
+def _parse(*chunks):
+    parser = PartialObjectParser(SPEC)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser
+
+
+def _value(parser):
+    return "".join(parser._value)
+
+
+def test_complete_object():
+    assert _parse('{"title": "Derby", "tone": "neutro"}').state == "done"
+
+
+def test_escape_split_across_chunks():
+    parser = _parse('{"tone": "neutro", "title": "a\\', 'nb\\', '"c')
+    assert _value(parser) == 'a\nb"c'
+    parser.feed('"}')
+    assert parser.state == "done"
+
+
+def test_unicode_escape_split_across_chunks():
+    parser = _parse('{"tone": "neutro", "title": "citt\\u0', '0e0')
+    assert _value(parser) == "città"
+
+
+def test_unicode_surrogate_pair():
+    parser = _parse('{"tone": "neutro", "title": "gol \\ud83d', '\\udd25')
+    assert _value(parser) == "gol \U0001F525"
+    parser.feed('"}')
+    assert parser.state == "done"
+
+
+def test_invalid_unicode_escape():
+    with pytest.raises(StructuredOutputError):
+        _parse('{"title": "\\u00zz')
+
+
+def test_enum_prefix_accepted_while_streaming():
+    parser = _parse('{"title": "Derby", "tone": "entu')
+    assert parser.state == "value"
+
+
+def test_enum_prefix_rejected_early():
+    with pytest.raises(StructuredOutputError, match="fuori enum"):
+        _parse('{"title": "Derby", "tone": "ironi')
+
+
+def test_enum_prefix_not_accepted_as_complete_value():
+    with pytest.raises(StructuredOutputError, match="fuori enum"):
+        _parse('{"title": "Derby", "tone": "neu"')
+
+
+def test_unknown_key():
+    with pytest.raises(StructuredOutputError, match="chiave inattesa"):
+        _parse('{"title": "Derby", "mood"')
+
+
+def test_over_length_value_rejected_before_closing_quote():
+    parser = _parse('{"tone": "neutro", "title": "' + "x" * 20)
+    with pytest.raises(StructuredOutputError, match="oltre 20 caratteri"):
+        parser.feed("x")
+
+
+def test_not_an_object():
+    with pytest.raises(StructuredOutputError):
+        _parse("Ecco l'articolo")
+
+
+class _FakeStream:
+    def __init__(self, text):
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_tokens_details=None)
+        self._chunks = [
+            SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content=text))]),
+            SimpleNamespace(usage=usage, choices=[SimpleNamespace(finish_reason="stop", delta=None)]),
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+def _fake_client(text):
+    async def create(**kwargs):
+        return _FakeStream(text)
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_validation_failures_are_counted():
+    errors = LLM_ERRORS.labels("test_site", "validation")
+    before = errors._value.get()
+    with pytest.raises(StructuredOutputError):
+        asyncio.run(structured_completion(_fake_client('{"title": "Derby", "tone": "ironico"}'),
+                                          "test_site", "gpt-test", "prompt", SPEC, max_tokens=100))
+    # Primo tentativo e tentativo a budget ridotto
+    assert errors._value.get() == before + 2